@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+"""Stress test and throughput benchmark for hosting games on threads.
+
+Plays many AI-vs-AI sessions on thread pools of increasing size and
+reports games per second for each. On a free-threaded CPython build
+(python3.13t or later, GIL disabled) throughput should scale with the
+number of threads; with the GIL it stays roughly flat.
+
+Also hammers single games from many threads at once and checks no grid
+space is ever resolved twice and no ship count is corrupted.
+
+    python bench.py --sessions 2000 --threads 1,2,4,8
+"""
+
+import argparse
+import random
+import sys
+import threading
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from engine import COORDS, AlreadyAttacked, Game, Player, RandomAIPlayer
+
+
+def play_session(_=None):
+    """Plays one RandomAIPlayer-vs-RandomAIPlayer game to the end.
+
+    :return: number of turns played
+    """
+    p1 = RandomAIPlayer('Player One')
+    p1.random_layout()
+    p2 = RandomAIPlayer('Player Two')
+    p2.random_layout()
+    game = Game(p1, p2)
+
+    turns = 0
+    while True:
+        player = game.current_player
+        coord = player.next_target()
+        outcome = game.play_turn(player, coord)
+        player.record_outcome(coord, outcome)
+        turns += 1
+
+        if outcome.is_game_over():
+            return turns
+
+
+def throughput(threads, sessions):
+    """Plays sessions on a thread pool.
+
+    :param threads: number of threads hosting sessions
+    :param sessions: number of games to play
+    :return: games per second
+    """
+    with ThreadPoolExecutor(threads) as executor:
+        start = perf_counter()
+        for _ in executor.map(play_session, range(sessions)):
+            pass
+        return sessions / (perf_counter() - start)
+
+
+def stress(threads, rounds):
+    """Races threads attacking every grid space of the same games.
+
+    :param threads: number of threads attacking each game
+    :param rounds: number of games to attack
+    :return: number of rounds where a space was resolved twice or the
+             ship count went wrong
+    """
+    failures = 0
+
+    for _ in range(rounds):
+        defender = Player('Defender')
+        defender.random_layout()
+        game = Game(Player('Attacker'), defender)
+        barrier = threading.Barrier(threads)
+        counts = [Counter() for _ in range(threads)]
+
+        def attack_everything(resolved):
+            coords = COORDS[:]
+            random.shuffle(coords)
+            barrier.wait()
+            for coord in coords:
+                try:
+                    game.take_turn(coord)
+                except AlreadyAttacked:
+                    continue
+                resolved[coord] += 1
+
+        workers = [threading.Thread(target=attack_everything, args=(resolved,))
+                   for resolved in counts]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        resolved = sum(counts, Counter())
+        twice = any(resolved[coord] != 1 for coord in COORDS)
+        if twice or defender.battle_grid.active_ship_count != 0:
+            failures += 1
+
+    return failures
+
+
+def gil_enabled():
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return True if is_gil_enabled is None else is_gil_enabled()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=1000,
+                        help='games played per thread count')
+    parser.add_argument('--threads', default='1,2,4,8',
+                        help='comma separated thread counts')
+    parser.add_argument('--stress-rounds', type=int, default=50,
+                        help='games raced by the stress test')
+    args = parser.parse_args()
+
+    thread_counts = [int(count) for count in args.threads.split(',')]
+
+    print('Python {0}, GIL {1}'.format(
+        sys.version.split()[0], 'enabled' if gil_enabled() else 'disabled'))
+
+    sys.setswitchinterval(1e-6)
+    failures = stress(max(thread_counts), args.stress_rounds)
+    sys.setswitchinterval(0.005)
+    print('stress: {0} of {1} rounds failed'.format(failures, args.stress_rounds))
+
+    baseline = None
+    for threads in thread_counts:
+        rate = throughput(threads, args.sessions)
+        baseline = baseline or rate
+        print('{0:>3} threads: {1:>9.1f} games/s  x{2:.2f}'.format(
+            threads, rate, rate / baseline))
+
+    sys.exit(1 if failures else 0)
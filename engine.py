@@ -2,10 +2,14 @@
 
 import re
 import random
-import traceback
+import threading
 
+from collections import deque
+from copy import deepcopy
 from enum import Enum, auto
 
+from events import DeliveryPolicy, Event, EventBus, EventType
+
 
 class OutcomeState(Enum):
     MISS = auto()
@@ -24,6 +28,9 @@ class Outcome:
 
     Clients should use static factory methods miss(),
     hit(ship), sunk(ship) and win(ship).
+
+    Under rules that reveal the spaces around sunk ships, revealed lists
+    the player co-ordinates uncovered by the outcome.
     """
 
     def __init__(self, outcome_state, ship_name=None):
@@ -35,6 +42,7 @@ class Outcome:
         """
         self.outcome_state = outcome_state
         self.ship_name = ship_name
+        self.revealed = []
 
     def __eq__(self, other):
         return self.outcome_state == other.outcome_state and self.ship_name == other.ship_name
@@ -145,6 +153,38 @@ class InvalidCoord(Exception):
         return "Coordinate {0} is invalid.".format(self.coord)
 
 
+class NotPlayersTurn(Exception):
+
+    """Raised when a player attempts a turn while it is their opponent's turn."""
+
+    def __init__(self, player):
+        """Allocates a new instance.
+
+        :param player: the player who attempted the turn
+        :return: new instance
+        """
+        self.player = player
+
+    def __str__(self):
+        return "It is not {0}'s turn.".format(self.player)
+
+
+class ShipsTouching(Exception):
+
+    """Raised when a ruleset forbids a ship from touching another ship."""
+
+    def __init__(self, coord):
+        """Allocates a new instance.
+
+        :param coord: the origin coord of the rejected placement
+        :return: new instance
+        """
+        self.coord = coord
+
+    def __str__(self):
+        return "Ship placed at {0} would touch another ship.".format(self.coord)
+
+
 class GridSpace:
 
     """Represents a non-empty space in the player game grid."""
@@ -301,17 +341,260 @@ class Ship:
 
 fleet = [Ship.carrier(), Ship.battleship(), Ship.cruiser(), Ship.submarine(), Ship.destroyer()]
 
+# player co-ordinates of every grid space in row-major order, and their indexes
+COORDS = ['{0}{1}'.format(row, column) for row in 'ABCDEFGH' for column in range(1, 9)]
+COORD_INDEX = {coord: index for index, coord in enumerate(COORDS)}
+
+
+class Placement:
+
+    """A ship position on the grid, precomputed as bit masks.
+
+    Bit i of a mask represents the grid space with row-major index i. number
+    is the position of the placement in GridMasks.placements(size).
+    """
+
+    def __init__(self, origin_coord, orientation, size, indexes, neighbors):
+        """Allocates a new instance.
+
+        :param origin_coord: topmost or leftmost player co-ordinate
+        :param orientation: portrait or landscape layout of the ship
+        :param size: number of grid spaces the ship occupies
+        :param indexes: row-major indexes of the occupied grid spaces
+        :param neighbors: per index mask of surrounding grid spaces
+        :return: new instance
+        """
+        self.origin_coord = origin_coord
+        self.orientation = orientation
+        self.size = size
+        self.indexes = indexes
+        self.number = None
+        self.mask = 0
+        for index in indexes:
+            self.mask |= 1 << index
+
+        self.halo = 0
+        for index in indexes:
+            self.halo |= neighbors[index]
+        self.halo &= ~self.mask
+
+
+class GridMasks:
+
+    """Neighbor masks and every ship placement for one grid dimension.
+
+    Built once per dimension by grid_masks() and shared by all grids.
+    """
+
+    # right, left, down, up as (row, column) steps; opposites are paired
+    DIRECTIONS = ((0, 1), (0, -1), (1, 0), (-1, 0))
+
+    def __init__(self, dimension):
+        """Allocates a new instance.
+
+        :param dimension: tuple of rows and columns
+        :return: new instance
+        """
+        (rows, columns) = dimension
+        self.dimension = dimension
+        self.coords = ['{0}{1}'.format(chr(row + 65), column + 1)
+                       for row in range(rows) for column in range(columns)]
+        self.index = {coord: index for index, coord in enumerate(self.coords)}
+
+        self.neighbors = []
+        for row in range(rows):
+            for column in range(columns):
+                mask = 0
+                for neighbor_row in range(max(row - 1, 0), min(row + 2, rows)):
+                    for neighbor_column in range(max(column - 1, 0), min(column + 2, columns)):
+                        mask |= 1 << (neighbor_row * columns + neighbor_column)
+                mask &= ~(1 << (row * columns + column))
+                self.neighbors.append(mask)
+
+        # per index, the orthogonal neighbor in each of the DIRECTIONS or None
+        self.adjacent = []
+        for row in range(rows):
+            for column in range(columns):
+                self.adjacent.append(tuple(
+                    (row + row_step) * columns + column + column_step
+                    if 0 <= row + row_step < rows and 0 <= column + column_step < columns
+                    else None
+                    for (row_step, column_step) in GridMasks.DIRECTIONS))
+
+        self._placements = {}
+        self._by_origin = {}
+
+    def __reduce__(self):
+        # pickle by dimension so unpickling shares the cached instance
+        return (grid_masks, (self.dimension,))
+
+    def placements(self, size):
+        """Returns every on-grid placement of a ship of a given size.
+
+        :param size: number of grid spaces the ship occupies
+        :return: list of Placement
+        """
+        if size not in self._placements:
+            (rows, columns) = self.dimension
+            placements = []
+
+            for row in range(rows):
+                for column in range(columns):
+                    origin = row * columns + column
+                    if column + size <= columns:
+                        placements.append(Placement(
+                            self.coords[origin], Orientation.LANDSCAPE, size,
+                            [origin + i for i in range(size)], self.neighbors))
+                    if row + size <= rows:
+                        placements.append(Placement(
+                            self.coords[origin], Orientation.PORTRAIT, size,
+                            [origin + i * columns for i in range(size)], self.neighbors))
+
+            self._placements[size] = placements
+            for number, placement in enumerate(placements):
+                placement.number = number
+                self._by_origin[(placement.origin_coord, placement.orientation, size)] = placement
+
+        return self._placements[size]
+
+    def placement(self, origin_coord, orientation, size):
+        """Looks up the placement of a ship.
+
+        :param origin_coord: topmost or leftmost player co-ordinate
+        :param orientation: portrait or landscape layout of the ship
+        :param size: number of grid spaces the ship occupies
+        :return: the Placement, or None when the ship would leave the grid
+        """
+        self.placements(size)
+        return self._by_origin.get((origin_coord, orientation, size))
+
+    def mask_of(self, coords):
+        """Converts player co-ordinates to a mask.
+
+        :param coords: iterable of player co-ordinates
+        :return: mask with the bit of each co-ordinate set
+        """
+        mask = 0
+        for coord in coords:
+            mask |= 1 << self.index[coord]
+        return mask
+
+    def coords_of(self, mask):
+        """Converts a mask to player co-ordinates.
+
+        :param mask: mask of grid spaces
+        :return: list of player co-ordinates in row-major order
+        """
+        coords = []
+        while mask:
+            low_bit = mask & -mask
+            coords.append(self.coords[low_bit.bit_length() - 1])
+            mask ^= low_bit
+        return coords
+
+    def halo(self, mask):
+        """Calculates the grid spaces surrounding a set of grid spaces.
+
+        :param mask: mask of grid spaces
+        :return: mask of surrounding grid spaces, excluding those in mask
+        """
+        halo = 0
+        remaining = mask
+        while remaining:
+            low_bit = remaining & -remaining
+            halo |= self.neighbors[low_bit.bit_length() - 1]
+            remaining ^= low_bit
+        return halo & ~mask
+
+    def sunk_run(self, cell, hits, size):
+        """Finds the grid spaces of a ship sunk by a shot.
+
+        :param cell: index of the grid space whose hit sank the ship
+        :param hits: indexes of grid spaces hit but not yet known sunk
+        :param size: number of grid spaces the sunk ship occupies
+        :return: list of indexes, the longest straight run of hits through
+                 cell of at most size spaces
+        """
+        best_run = [cell]
+        for direction in (0, 2):
+            run = [cell]
+            for step in (direction, direction + 1):
+                neighbor = self.adjacent[cell][step]
+                while neighbor is not None and neighbor in hits and len(run) < size:
+                    run.append(neighbor)
+                    neighbor = self.adjacent[neighbor][step]
+            if len(run) > len(best_run):
+                best_run = run
+        return best_run
+
+
+_grid_masks = {}
+
+
+def grid_masks(dimension):
+    """Returns the shared GridMasks of a grid dimension, building it once.
+
+    :param dimension: tuple of rows and columns
+    :return: GridMasks instance
+    """
+    masks = _grid_masks.get(dimension)
+    if masks is None:
+        masks = _grid_masks.setdefault(dimension, GridMasks(dimension))
+    return masks
+
+
+class Ruleset:
+
+    """House rules for laying out and sinking ships.
+
+    :ivar ships: the fleet each player lays out
+    :ivar no_touch: ships may not touch, even diagonally
+    :ivar reveal_adjacent_on_sunk: sinking a ship reveals the spaces around it
+    """
+
+    def __init__(self, ships=None, no_touch=False, reveal_adjacent_on_sunk=False):
+        """Allocates a new instance.
+
+        :param ships: optional fleet; the standard fleet when None
+        :param no_touch: True to forbid ships touching
+        :param reveal_adjacent_on_sunk: True to reveal spaces around sunk ships
+        :return: new instance
+        """
+        self.ships = ships if ships is not None else fleet
+        self.no_touch = no_touch
+        self.reveal_adjacent_on_sunk = reveal_adjacent_on_sunk
+
+    def exclusion(self, placement):
+        """Calculates the grid spaces no other ship may occupy after a placement.
+
+        :param placement: the Placement of a ship
+        :return: mask of excluded grid spaces
+        """
+        if self.no_touch:
+            return placement.mask | placement.halo
+        return placement.mask
+
+
+STANDARD_RULES = Ruleset()
+
 class BattleGrid:
     coord_regex = r'^([A-H])([0-8])$'
 
-    def __init__(self):
+    def __init__(self, ruleset=None):
         """Allocates a new instance.
 
+        :param ruleset: optional Ruleset; standard rules when None
         :return: new instance
         """
         self.grid = {}
         self.active_ship_count = 0
         self.grid_dimension = (8, 8)
+        self.ruleset = ruleset if ruleset is not None else STANDARD_RULES
+        self.masks = grid_masks(self.grid_dimension)
+        self.occupied = 0
+        self.excluded = 0
+        self.attacked = 0
+        self.placements = []
 
     def valid_coord(self, coord):
         """Tests whether player co-ordinate string passes the validation regex.
@@ -423,83 +706,154 @@ class BattleGrid:
         if not self.valid_coord(origin_coord):
             raise InvalidCoord(origin_coord)
 
-        coord_tuple = self.split_coord(origin_coord)
+        placement = self.masks.placement(origin_coord, orientation, ship.size)
 
-        coords = self._calculate_coords(coord_tuple, orientation, ship.size)
+        if placement is None:
+            raise InvalidCoord(origin_coord)
 
-        # validate all coords within grid and unoccupied
-        for coord in coords:
-            if not self.valid_coord(coord):
-                raise InvalidCoord(coord)
-            if coord in self.grid:
-                raise AlreadyAssigned(coord)
+        overlap = placement.mask & self.occupied
+        if overlap:
+            raise AlreadyAssigned(self.masks.coords_of(overlap)[0])
+        if placement.mask & self.excluded:
+            raise ShipsTouching(origin_coord)
 
-        for coord in coords:
-            self._set_grid_space(coord, ship)
+        self._place(ship, placement)
+
+    def _place(self, ship, placement):
+        """Places a ship at a placement already checked to be legal."""
+        for index in placement.indexes:
+            coord = self.masks.coords[index]
+            self.grid[coord] = GridSpace(self, coord, ship)
 
+        self.occupied |= placement.mask
+        self.excluded |= self.ruleset.exclusion(placement)
+        self.placements.append((ship, placement))
         self.active_ship_count += 1
 
+    def legal_placements(self, ship):
+        """Lists where a ship can be placed given the ships already placed.
+
+        :param ship: the ship to place
+        :return: list of Placement
+        """
+        excluded = self.excluded
+        return [placement for placement in self.masks.placements(ship.size)
+                if not placement.mask & excluded]
 
     def random_layout(self, ships):
-        attempted = set()
-        max_attempts = 8 * 8 * 2
-
-        ships_remaining = ships[:]
-        while len(ships_remaining) > 0:
-            while len(attempted) < max_attempts and len(ships_remaining) > 0:
-                #generate random coord and orientation
-                coord = random.choice('ABCDEFGH') + random.choice('12345678')
-                orientation = random.choice(list(Orientation))
-                coord_and_orientation = (coord, orientation)
-                ship = ships_remaining[0]
-
-                if coord_and_orientation not in attempted:
-                    attempted.add(coord_and_orientation)
-                    try:
-                        self.place_ship(ship, coord, orientation)
-                    except (AlreadyAssigned, InvalidCoord) as e:
-                        pass
-                    except Exception as e:
-                        traceback.print_exc(e)
-                    else:
-                        ships_remaining.pop(0)
-
-            if len(ships_remaining) > 0:
-                # we failed to place all the ships so try again
-                ships_remaining = ships[:]
-                self.reset()
+        """Randomly places ships, each at a legal placement under the ruleset.
+
+        Starts over when a ship has no legal placement left.
+
+        :param ships: ships to place on battle grid
+        """
+        placed = False
+        while not placed:
+            placed = True
+            for ship in ships:
+                candidates = self.legal_placements(ship)
+                if not candidates:
+                    placed = False
+                    self.reset()
+                    break
+                self._place(ship, random.choice(candidates))
+
+    def placement_of(self, ship):
+        """Looks up where a ship was placed.
+
+        :param ship: a ship placed on this grid
+        :return: the ship's Placement, or None when not placed by place_ship()
+                 or random_layout()
+        """
+        for placed, placement in self.placements:
+            if placed is ship:
+                return placement
+        return None
+
+    def ship_coords(self, ship):
+        """Lists the player co-ordinates a ship occupies.
+
+        :param ship: a ship placed on this grid
+        :return: list of player co-ordinates
+        """
+        placement = self.placement_of(ship)
+        if placement is not None:
+            return self.masks.coords_of(placement.mask)
+        return [coord for coord, grid_space in self.grid.items() if grid_space.ship is ship]
+
+    def record_attack(self, coord):
+        """Marks a grid space as attacked in the attacked mask.
+
+        :param coord: player co-ordinate of the attacked grid space
+        """
+        index = self.masks.index.get(coord)
+        if index is not None:
+            self.attacked |= 1 << index
+
+    def reveal_around(self, ship):
+        """Marks the un-attacked spaces around a ship as misses.
+
+        :param ship: a ship placed on this grid
+        :return: list of revealed player co-ordinates
+        """
+        placement = self.placement_of(ship)
+        if placement is not None:
+            revealed = self.masks.coords_of(placement.halo & ~(self.attacked | self.occupied))
+        else:
+            # ships set space by space are not in the occupied mask
+            halo = self.masks.halo(self.masks.mask_of(self.ship_coords(ship)))
+            revealed = [coord for coord in self.masks.coords_of(halo) if coord not in self.grid]
+
+        for coord in revealed:
+            self.grid[coord] = GridSpace(self, coord, state='miss')
+        self.attacked |= self.masks.mask_of(revealed)
+
+        return revealed
 
     def reset(self):
         self.grid = {}
         self.active_ship_count = 0
+        self.occupied = 0
+        self.excluded = 0
+        self.attacked = 0
+        self.placements = []
 
 
 class Player:
 
     """Player of the game, including their battle grid."""
 
-    def __init__(self, name):
+    def __init__(self, name, ruleset=None):
         """Allocates a new instance of a named player.
 
         :param name: name of player
+        :param ruleset: optional Ruleset for the player's battle grid
 
         :return: new instance
         """
         self.name = name
-        self.battle_grid = BattleGrid()
+        self.battle_grid = BattleGrid(ruleset)
 
 
-    def random_layout(self, fleet):
+    def random_layout(self, fleet=None):
         """Randomly layout fleet on player's battle grid.
 
-        :param fleet: ships to place on battle grid
+        :param fleet: ships to place on battle grid; copies of the
+                      ruleset's fleet when None
         """
+        if fleet is None:
+            fleet = deepcopy(self.battle_grid.ruleset.ships)
         self.battle_grid.random_layout(fleet)
 
     def receive_attack(self, coord):
+        self.battle_grid.record_attack(coord)
         if (coord in self.battle_grid.grid.keys()):
             targeted = self.battle_grid.grid[coord]
-            return targeted.attack()
+            outcome = targeted.attack()
+            if (outcome.outcome_state in (OutcomeState.SUNK, OutcomeState.WIN) and
+                    self.battle_grid.ruleset.reveal_adjacent_on_sunk):
+                outcome.revealed = self.battle_grid.reveal_around(targeted.ship)
+            return outcome
         else:
             self.battle_grid.grid[coord] = GridSpace(
                 self, coord, state='miss')
@@ -513,17 +867,312 @@ class Player:
         return self.name
 
 class AIPlayer(Player):
-    def __init__(self,name):
-        super().__init__(name)
+
+    """Computer controlled player.
+
+    Subclasses implement next_target(). A deadline-bound scheduler runs the
+    default search_target() on a copy made by copy_for_search() and only
+    adopt()s the copy once its target is accepted, so an abandoned search
+    never changes the player. Players whose targeting is expensive may
+    instead override search_target() to offer improving targets as they go;
+    such searches run on the player itself and must stop once cancelled.
+    """
+
+    # attributes a search copy shares with the player rather than copies
+    SEARCH_SHARED = ('battle_grid',)
+
+    def __init__(self, name, ruleset=None):
+        super().__init__(name, ruleset)
+        self.attacked = set()
+
+    def next_target(self):
+        """Chooses the next player co-ordinate to attack.
+
+        :return: player co-ordinate, e.g. 'A7'
+        """
+        raise NotImplementedError
+
+    def search_target(self, search):
+        """Offers targets to a search until done or the search is cancelled.
+
+        :param search: object with an offer(coord) method and cancelled flag
+        """
+        search.offer(self.next_target())
+
+    def copy_for_search(self):
+        """Copies the targeting state of this player for a search to change.
+
+        :return: a new player of the same type
+        """
+        memo = {}
+        for name in self.SEARCH_SHARED:
+            shared = getattr(self, name)
+            memo[id(shared)] = shared
+        return deepcopy(self, memo)
+
+    def adopt(self, searched):
+        """Takes on the targeting state of a copy after its search.
+
+        :param searched: a copy made by copy_for_search()
+        """
+        self.__dict__.update(searched.__dict__)
+
+    def fallback_target(self):
+        """Cheaply chooses a target when next_target() runs out of time.
+
+        :return: a random player co-ordinate not yet attacked
+        """
+        return random.choice([coord for coord in COORDS if coord not in self.attacked])
+
+    def record_outcome(self, coord, outcome):
+        """Tracks the outcome of an attack made by this player.
+
+        :param coord: the player co-ordinate that was attacked
+        :param outcome: the Outcome of the attack
+        """
+        self.attacked.add(coord)
+        self.attacked.update(outcome.revealed)
 
 class RandomAIPlayer(AIPlayer):
-    def __init__(self,name):
-        super().__init__(name)
+
+    """Attacks grid spaces in a random order.
+
+    Under rules where ships may not touch, the spaces around a sunk ship
+    are skipped, as they cannot hold another ship.
+    """
+
+    def __init__(self, name, ruleset=None):
+        super().__init__(name, ruleset)
         self.targets = ["{0}{1}".format(row,column) for row in 'ABCDEFGH' for column in range(1,9)]
         random.shuffle(self.targets)
+        self.ship_sizes = {ship.name: ship.size for ship in self.battle_grid.ruleset.ships}
+        self.hits = set()
+
+    def next_target(self):
+        target = self.targets.pop(0)
+        while target in self.attacked:
+            target = self.targets.pop(0)
+        return target
+
+    def fallback_target(self):
+        return self.next_target()
+
+    def record_outcome(self, coord, outcome):
+        super().record_outcome(coord, outcome)
+
+        if outcome.outcome_state == OutcomeState.MISS:
+            return
+
+        masks = self.battle_grid.masks
+        cell = masks.index[coord]
+        self.hits.add(cell)
+
+        if outcome.outcome_state != OutcomeState.HIT:
+            size = self.ship_sizes.get(outcome.ship_name, 1)
+            sunk_mask = 0
+            for hit in masks.sunk_run(cell, self.hits, size):
+                self.hits.discard(hit)
+                sunk_mask |= 1 << hit
+
+            if self.battle_grid.ruleset.no_touch:
+                self.attacked.update(masks.coords_of(masks.halo(sunk_mask)))
+
+class _CellPool:
+
+    """Set of grid space indexes with O(1) add, discard and random pop.
+
+    Members are kept in a list; a position array maps each index to its
+    slot in the list so it can be swapped with the last member and removed.
+    """
+
+    def __init__(self, cell_count):
+        self.cells = []
+        self.positions = [None] * cell_count
+
+    def __len__(self):
+        return len(self.cells)
+
+    def add(self, cell):
+        if self.positions[cell] is None:
+            self.positions[cell] = len(self.cells)
+            self.cells.append(cell)
+
+    def discard(self, cell):
+        position = self.positions[cell]
+        if position is not None:
+            last = self.cells.pop()
+            if last != cell:
+                self.cells[position] = last
+                self.positions[last] = position
+            self.positions[cell] = None
+
+    def pop_random(self):
+        cell = self.cells[random.randrange(len(self.cells))]
+        self.discard(cell)
+        return cell
+
+    def pop_best(self, scores, samples):
+        """Pops the highest scoring of a few randomly sampled members."""
+        cell = max((self.cells[random.randrange(len(self.cells))] for _ in range(samples)),
+                   key=scores.__getitem__)
+        self.discard(cell)
+        return cell
+
+
+class HuntTargetAIPlayer(AIPlayer):
+
+    """AI player that hunts on a parity pattern and targets around hits.
+
+    While hunting, only grid spaces whose row plus column is congruent to a
+    fixed offset modulo the smallest remaining ship size are attacked, as
+    every remaining ship must cover one of them. After a hit, the player
+    targets the open orthogonal neighbors of unresolved hits, preferring
+    spaces that extend a line of hits, and returns to hunting once sunk
+    outcomes account for every hit.
+
+    Given a prior, each hunt shot samples a few candidates and attacks the
+    one the prior rates most likely to hold a ship. The prior is either a
+    PlacementPrior, whose cell_prior() is consulted on every shot so the
+    player follows it as it keeps learning, or a fixed sequence of scores
+    indexed by grid space, such as a frozen copy of cell_prior().
+
+    Relies on record_outcome() being called after each attack. Every shot
+    costs O(1) bookkeeping, apart from re-partitioning the hunt pools when
+    the smallest remaining ship is sunk.
+    """
+
+    # hunt candidates sampled per shot when a prior is given
+    PRIOR_SAMPLES = 4
+
+    SEARCH_SHARED = AIPlayer.SEARCH_SHARED + ('masks', 'prior')
+
+    def __init__(self, name, ruleset=None, prior=None):
+        super().__init__(name, ruleset)
+        self.prior = prior
+        self.masks = self.battle_grid.masks
+        self.ship_sizes = {ship.name: ship.size for ship in self.battle_grid.ruleset.ships}
+        self.remaining = sorted(self.ship_sizes.values())
+
+        self.hits = set()
+        self.frontier = deque()
+        self.queued = set()
+        self._attacked_cells = set()
+
+        self._partition_hunt()
 
     def next_target(self):
-        return self.targets.pop(0)
+        while self.frontier:
+            cell = self.frontier.popleft()
+            self.queued.discard(cell)
+            if cell not in self._attacked_cells:
+                self._take(cell)
+                return self.masks.coords[cell]
+
+        for pool in self._hunt_order():
+            if pool:
+                if self.prior is None:
+                    cell = pool.pop_random()
+                else:
+                    cell = pool.pop_best(self._prior_scores(), self.PRIOR_SAMPLES)
+                self._take(cell)
+                return self.masks.coords[cell]
+
+        return self.fallback_target()
+
+    def record_outcome(self, coord, outcome):
+        super().record_outcome(coord, outcome)
+
+        cell = self.masks.index[coord]
+        self._take(cell)
+        for revealed in outcome.revealed:
+            self._take(self.masks.index[revealed])
+
+        if outcome.outcome_state == OutcomeState.MISS:
+            return
+
+        self.hits.add(cell)
+
+        if outcome.outcome_state == OutcomeState.HIT:
+            self._queue_neighbors(cell)
+        else:
+            self._resolve_sunk(cell, outcome.ship_name)
+
+    def _prior_scores(self):
+        """Returns the current per grid space scores of the prior."""
+        cell_prior = getattr(self.prior, 'cell_prior', None)
+        return self.prior if cell_prior is None else cell_prior()
+
+    def _take(self, cell):
+        """Marks a grid space as attacked and drops it from the hunt pools."""
+        self._attacked_cells.add(cell)
+        self.attacked.add(self.masks.coords[cell])
+        self._pools[self._residue(cell)].discard(cell)
+
+    def _residue(self, cell):
+        (row, column) = divmod(cell, self.masks.dimension[1])
+        return (row + column) % self._modulus
+
+    def _partition_hunt(self):
+        """Splits the un-attacked grid spaces into pools by parity residue."""
+        self._modulus = max(self.remaining[0], 1) if self.remaining else 1
+        self._offset = random.randrange(self._modulus)
+        self._pools = [_CellPool(len(self.masks.coords)) for _ in range(self._modulus)]
+
+        for cell in range(len(self.masks.coords)):
+            if cell not in self._attacked_cells:
+                self._pools[self._residue(cell)].add(cell)
+
+    def _hunt_order(self):
+        """Yields the parity pool first, then the others as a last resort."""
+        yield self._pools[self._offset]
+        for residue, pool in enumerate(self._pools):
+            if residue != self._offset:
+                yield pool
+
+    def _queue_neighbors(self, cell):
+        """Queues the open orthogonal neighbors of a hit.
+
+        A neighbor that continues a line through an adjacent hit goes to the
+        front of the queue.
+        """
+        adjacent = self.masks.adjacent[cell]
+
+        for direction, neighbor in enumerate(adjacent):
+            if neighbor is None or neighbor in self._attacked_cells or neighbor in self.queued:
+                continue
+
+            behind = adjacent[direction ^ 1]
+            self.queued.add(neighbor)
+            if behind is not None and behind in self.hits:
+                self.frontier.appendleft(neighbor)
+            else:
+                self.frontier.append(neighbor)
+
+    def _resolve_sunk(self, cell, ship_name):
+        """Removes the hits of a sunk ship and updates the hunt parity."""
+        size = self.ship_sizes.get(ship_name, 1)
+
+        sunk_mask = 0
+        for hit in self.masks.sunk_run(cell, self.hits, size):
+            self.hits.discard(hit)
+            sunk_mask |= 1 << hit
+
+        if self.battle_grid.ruleset.no_touch:
+            for neighbor in self.masks.coords_of(self.masks.halo(sunk_mask)):
+                self._take(self.masks.index[neighbor])
+
+        if not self.hits:
+            self.frontier.clear()
+            self.queued.clear()
+        elif not self.frontier:
+            for hit in self.hits:
+                self._queue_neighbors(hit)
+
+        if size in self.remaining:
+            smallest = self.remaining[0]
+            self.remaining.remove(size)
+            if self.remaining and self.remaining[0] != smallest:
+                self._partition_hunt()
 
 class Game:
 
@@ -533,6 +1182,16 @@ class Game:
     current_layer and current_opponent. The next_player() method swaps these players
     and the take_turn method places the current_player in the role of the player
     making the attack and current_opponent as the player being attacked.
+
+    Observers register with subscribe() and receive Events through bounded
+    queues, so a slow observer cannot stall take_turn().
+
+    Turns are resolved while holding a per-game lock, so a game may be driven
+    from several threads. play_turn() additionally checks whose turn it is
+    and passes the turn on in the same locked step.
+
+    Pickling a game keeps its players and grids but not its lock or
+    subscribers.
     """
 
     def __init__(self, human, computer):
@@ -546,13 +1205,52 @@ class Game:
         self.computer = computer
         self.current_player = human
         self.current_opponent = computer
+        self.events = EventBus()
+        self.lock = threading.RLock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['events']
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.events = EventBus()
+        self.lock = threading.RLock()
+
+    def subscribe(self, callback=None, maxsize=64, policy=DeliveryPolicy.DROP,
+                  event_types=None):
+        """Registers an observer of this game's events.
+
+        :param callback: optional callable invoked with each Event on a
+                         dispatch thread; poll the subscription when None
+        :param maxsize: maximum number of events queued for the observer
+        :param policy: DeliveryPolicy.DROP discards the oldest queued event
+                       when full; DeliveryPolicy.BLOCK waits for the observer
+        :param event_types: optional EventTypes to receive; all when None
+        :return: the new Subscription
+        """
+        return self.events.subscribe(callback, maxsize, policy, event_types)
+
+    def unsubscribe(self, subscription):
+        """Removes an observer registered with subscribe().
+
+        :param subscription: the Subscription returned by subscribe()
+        """
+        self.events.unsubscribe(subscription)
 
     def next_player(self):
         """Swaps current_player and current_opponent."""
 
-        self.current_player, self.current_opponent = self.current_opponent, self.current_player
+        with self.lock:
+            self.current_player, self.current_opponent = self.current_opponent, self.current_player
+
+            if self.events.subscriptions:
+                self.events.publish(Event(EventType.PLAYER_SWITCHED,
+                                          self.current_player, self.current_opponent))
 
-        return self.current_player
+            return self.current_player
 
     def take_turn(self, coord):
         """Current player attacks a grid space identified by a player co-ordinate.
@@ -562,4 +1260,44 @@ class Game:
                  or the game being won (including which ship was sunk to trigger the win)
         """
 
-        return self.current_opponent.receive_attack(coord)
+        with self.lock:
+            outcome = self.current_opponent.receive_attack(coord)
+
+            if self.events.subscriptions:
+                self._publish_turn(coord, outcome)
+
+            return outcome
+
+    def play_turn(self, player, coord):
+        """Resolves a whole turn for a player as one atomic step.
+
+        Checks it is the player's turn, attacks coord and, unless the game is
+        won, makes the opponent the current player.
+
+        :param player: the player taking the turn
+        :param coord: the player co-ordinate of the grid space being attacked
+        :return: the Outcome of the attack
+        """
+        with self.lock:
+            if self.current_player is not player:
+                raise NotPlayersTurn(player)
+
+            outcome = self.take_turn(coord)
+
+            if not outcome.is_game_over():
+                self.next_player()
+
+            return outcome
+
+    def _publish_turn(self, coord, outcome):
+        """Publishes the events describing a resolved turn."""
+        event_types = [EventType.TURN_TAKEN, EventType.OUTCOME]
+
+        if outcome.outcome_state in (OutcomeState.SUNK, OutcomeState.WIN):
+            event_types.append(EventType.SHIP_SUNK)
+        if outcome.is_game_over():
+            event_types.append(EventType.GAME_WON)
+
+        for event_type in event_types:
+            self.events.publish(Event(event_type, self.current_player,
+                                      self.current_opponent, coord, outcome))
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+from copy import deepcopy
+
+import numpy as np
+
+from engine import (COORD_INDEX, COORDS, AlreadyAttacked, Game, InvalidCoord,
+                    OutcomeState, Player, fleet)
+
+
+# observation channels
+UNKNOWN = 0
+MISS = 1
+HIT = 2
+SUNK = 3
+CHANNELS = 4
+
+
+def target_observation(player, out=None):
+    """Builds the observation of a player's grid as seen by their opponent.
+
+    Holds the same information as main.create_target_view, one channel per
+    cell state: unknown, miss and hit, plus a mask of cells of sunk ships.
+
+    :param player: the player being attacked
+    :param out: optional uint8 array of shape (4, 8, 8) to fill in place
+    :return: the observation array
+    """
+    (rows, columns) = player.battle_grid.grid_dimension
+
+    if out is None:
+        out = np.empty((CHANNELS, rows, columns), dtype=np.uint8)
+
+    out.fill(0)
+    flat = out.reshape(CHANNELS, rows * columns)
+    flat[UNKNOWN] = 1
+
+    for coord, grid_space in player.battle_grid.grid.items():
+        index = COORD_INDEX.get(coord)
+        if index is None:
+            continue
+
+        if grid_space.is_miss():
+            flat[UNKNOWN, index] = 0
+            flat[MISS, index] = 1
+        elif grid_space.is_hit():
+            flat[UNKNOWN, index] = 0
+            flat[HIT, index] = 1
+            if grid_space.ship.is_sunk():
+                flat[SUNK, index] = 1
+
+    return out
+
+
+class VectorEnv:
+
+    """Runs a batch of single-agent games with a gym-style interface.
+
+    In each game the agent attacks a randomly laid out fleet. Actions are
+    grid space indexes in row-major order (0 for A1, 63 for H8). Observations
+    are a uint8 array of shape (num_envs, 4, 8, 8) holding the unknown, miss,
+    hit and sunk channels of every game.
+
+    The observation, reward, done and info arrays are allocated once and
+    updated in place by every step(), so callers must copy anything they
+    want to keep. Finished games are reset automatically; the done flag and
+    info['episode_shots'] report the game that just ended.
+    """
+
+    def __init__(self, num_envs, ships=fleet, hit_reward=1.0, miss_reward=0.0,
+                 invalid_reward=-1.0):
+        """Allocates a new instance.
+
+        :param num_envs: number of games run side by side
+        :param ships: fleet laid out for the agent to attack
+        :param hit_reward: reward for a shot that hits a ship
+        :param miss_reward: reward for a shot that misses
+        :param invalid_reward: reward for attacking an already attacked space
+        :return: new instance
+        """
+        self.num_envs = num_envs
+        self.ships = ships
+        self.hit_reward = hit_reward
+        self.miss_reward = miss_reward
+        self.invalid_reward = invalid_reward
+
+        (rows, columns) = Player('').battle_grid.grid_dimension
+        self.observations = np.zeros((num_envs, CHANNELS, rows, columns), dtype=np.uint8)
+        self.rewards = np.zeros(num_envs, dtype=np.float32)
+        self.dones = np.zeros(num_envs, dtype=bool)
+        self.infos = {'episode_shots': np.zeros(num_envs, dtype=np.int32)}
+
+        self._cells = self.observations.reshape(num_envs, CHANNELS, rows * columns)
+        self._shots = np.zeros(num_envs, dtype=np.int32)
+        self.games = [None] * num_envs
+        self._ship_cells = [None] * num_envs
+
+        self.reset()
+
+    def reset(self):
+        """Starts a new game in every slot of the batch.
+
+        :return: the observations array
+        """
+        for index in range(self.num_envs):
+            self._reset_game(index)
+
+        self.rewards.fill(0)
+        self.dones.fill(False)
+        self.infos['episode_shots'].fill(0)
+
+        return self.observations
+
+    def step(self, actions):
+        """Takes one shot in every game of the batch.
+
+        Every action is checked before any shot is taken, so a batch of the
+        wrong length or with an out of range action leaves every game
+        unchanged.
+
+        :param actions: sequence of num_envs grid space indexes
+        :return: tuple of observations, rewards, dones and infos arrays
+        """
+        if len(actions) != self.num_envs:
+            raise ValueError('Expected {0} actions, got {1}.'.format(
+                self.num_envs, len(actions)))
+
+        for action in actions:
+            if not 0 <= action < len(COORDS):
+                raise InvalidCoord(action)
+
+        cells = self._cells
+        rewards = self.rewards
+        dones = self.dones
+        episode_shots = self.infos['episode_shots']
+
+        dones.fill(False)
+        episode_shots.fill(0)
+
+        for index, action in enumerate(actions):
+            game = self.games[index]
+            self._shots[index] += 1
+
+            try:
+                outcome = game.take_turn(COORDS[action])
+            except AlreadyAttacked:
+                rewards[index] = self.invalid_reward
+                continue
+
+            env_cells = cells[index]
+            env_cells[UNKNOWN, action] = 0
+            state = outcome.outcome_state
+
+            if state == OutcomeState.MISS:
+                env_cells[MISS, action] = 1
+                rewards[index] = self.miss_reward
+                continue
+
+            env_cells[HIT, action] = 1
+            rewards[index] = self.hit_reward
+
+            if state != OutcomeState.HIT:
+                env_cells[SUNK, self._ship_cells[index][outcome.ship_name]] = 1
+
+            if state == OutcomeState.WIN:
+                dones[index] = True
+                episode_shots[index] = self._shots[index]
+                self._reset_game(index)
+
+        return self.observations, rewards, dones, self.infos
+
+    def action_masks(self):
+        """Returns which grid spaces each game can still attack.
+
+        :return: bool array of shape (num_envs, 64)
+        """
+        return self._cells[:, UNKNOWN].astype(bool)
+
+    def _reset_game(self, index):
+        """Replaces the game at index with a freshly laid out one."""
+        opponent = Player('Fleet')
+        opponent.random_layout(deepcopy(self.ships))
+
+        ship_cells = {}
+        for coord, grid_space in opponent.battle_grid.grid.items():
+            ship_cells.setdefault(grid_space.ship.name, []).append(COORD_INDEX[coord])
+
+        self.games[index] = Game(Player('Agent'), opponent)
+        self._ship_cells[index] = {name: np.array(cells) for name, cells in ship_cells.items()}
+        self._shots[index] = 0
+
+        env_cells = self._cells[index]
+        env_cells.fill(0)
+        env_cells[UNKNOWN] = 1
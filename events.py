@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+
+import threading
+import traceback
+
+from collections import deque
+from enum import Enum, auto
+
+
+class EventType(Enum):
+    TURN_TAKEN = auto()
+    OUTCOME = auto()
+    SHIP_SUNK = auto()
+    GAME_WON = auto()
+    PLAYER_SWITCHED = auto()
+
+
+class DeliveryPolicy(Enum):
+    DROP = auto()
+    BLOCK = auto()
+
+
+class Event:
+
+    """An event published by a Game to its subscribers."""
+
+    def __init__(self, event_type, player, opponent, coord=None, outcome=None):
+        """Allocates a new instance.
+
+        :param event_type: EventType value
+        :param player: the current player when the event occurred
+        :param opponent: the current opponent when the event occurred
+        :param coord: optional player co-ordinate that was attacked
+        :param outcome: optional Outcome of the attack
+        :return: new instance
+        """
+        self.event_type = event_type
+        self.player = player
+        self.opponent = opponent
+        self.coord = coord
+        self.outcome = outcome
+
+    def __eq__(self, other):
+        return (self.event_type == other.event_type and
+                self.player == other.player and
+                self.opponent == other.opponent and
+                self.coord == other.coord and
+                self.outcome == other.outcome)
+
+    def __str__(self):
+        return '{0}: {1} {2} {3}'.format(
+            self.event_type.name, self.player, self.coord or '',
+            self.outcome or '').strip()
+
+
+class Subscription:
+
+    """A bounded queue of events delivered to one subscriber.
+
+    When the queue is full, the DROP policy discards the oldest queued event
+    so the publisher never waits, while the BLOCK policy makes the publisher
+    wait until the subscriber catches up.
+    """
+
+    def __init__(self, maxsize=64, policy=DeliveryPolicy.DROP, event_types=None):
+        """Allocates a new instance.
+
+        :param maxsize: maximum number of queued events
+        :param policy: DeliveryPolicy applied when the queue is full
+        :param event_types: optional EventTypes to receive; all when None
+        :return: new instance
+        """
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1')
+
+        self.maxsize = maxsize
+        self.policy = policy
+        self.event_types = frozenset(event_types) if event_types else None
+        self.dropped = 0
+        self.closed = False
+        self._events = deque()
+        self._condition = threading.Condition()
+
+    def __len__(self):
+        return len(self._events)
+
+    def wants(self, event_type):
+        """Tests whether this subscription receives events of a type.
+
+        :param event_type: EventType value
+        :return: True when wanted; False otherwise
+        """
+        return self.event_types is None or event_type in self.event_types
+
+    def put(self, event):
+        """Queues an event, applying the delivery policy when full.
+
+        :param event: the Event to queue
+        """
+        with self._condition:
+            if self.closed:
+                return
+
+            if len(self._events) >= self.maxsize:
+                if self.policy == DeliveryPolicy.DROP:
+                    self._events.popleft()
+                    self.dropped += 1
+                else:
+                    while len(self._events) >= self.maxsize and not self.closed:
+                        self._condition.wait()
+
+                    if self.closed:
+                        return
+
+            self._events.append(event)
+            self._condition.notify_all()
+
+    def get(self, timeout=None):
+        """Removes and returns the oldest queued event.
+
+        :param timeout: optional seconds to wait for an event
+        :return: the oldest Event, or None on timeout or once closed and empty
+        """
+        with self._condition:
+            if not self._condition.wait_for(
+                    lambda: self._events or self.closed, timeout):
+                return None
+
+            if not self._events:
+                return None
+
+            event = self._events.popleft()
+            self._condition.notify_all()
+
+            return event
+
+    def drain(self):
+        """Removes and returns every queued event.
+
+        :return: list of Events, oldest first
+        """
+        with self._condition:
+            events = list(self._events)
+            self._events.clear()
+            self._condition.notify_all()
+
+            return events
+
+    def close(self):
+        """Stops delivery and wakes any waiting publisher or consumer."""
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+
+class EventBus:
+
+    """Publishes events to subscriptions.
+
+    Subscriptions may be polled with get() or drain(), or given a callback
+    that is invoked on a dedicated daemon thread, keeping slow consumers off
+    the publisher's thread.
+    """
+
+    def __init__(self):
+        """Allocates a new instance.
+
+        :return: new instance
+        """
+        self.subscriptions = ()
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback=None, maxsize=64, policy=DeliveryPolicy.DROP,
+                  event_types=None):
+        """Registers a new subscription.
+
+        :param callback: optional callable invoked with each Event on a
+                         dispatch thread
+        :param maxsize: maximum number of queued events
+        :param policy: DeliveryPolicy applied when the queue is full
+        :param event_types: optional EventTypes to receive; all when None
+        :return: the new Subscription
+        """
+        subscription = Subscription(maxsize, policy, event_types)
+
+        with self._lock:
+            self.subscriptions = self.subscriptions + (subscription,)
+
+        if callback is not None:
+            threading.Thread(target=self._dispatch,
+                             args=(subscription, callback),
+                             daemon=True).start()
+
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Removes and closes a subscription.
+
+        :param subscription: the Subscription to remove
+        """
+        with self._lock:
+            self.subscriptions = tuple(
+                s for s in self.subscriptions if s is not subscription)
+
+        subscription.close()
+
+    def wants(self, event_type):
+        """Tests whether any subscription receives events of a type.
+
+        :param event_type: EventType value
+        :return: True when wanted; False otherwise
+        """
+        return any(s.wants(event_type) for s in self.subscriptions)
+
+    def publish(self, event):
+        """Delivers an event to every subscription that wants it.
+
+        :param event: the Event to publish
+        """
+        for subscription in self.subscriptions:
+            if subscription.wants(event.event_type):
+                subscription.put(event)
+
+    @staticmethod
+    def _dispatch(subscription, callback):
+        while True:
+            event = subscription.get()
+            if event is None:
+                return
+            try:
+                callback(event)
+            except Exception:
+                traceback.print_exc()
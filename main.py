@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 
-from engine import Player, AIPlayer, RandomAIPlayer, Game, Ship, AlreadyAttacked, Orientation, fleet
-from time import sleep
+from engine import Player, AIPlayer, HuntTargetAIPlayer, Game, Ship, AlreadyAttacked, Orientation, fleet
+from scheduler import MoveScheduler
 from copy import deepcopy
 
 def create_fleet_view(player):
@@ -102,22 +102,22 @@ if __name__ == '__main__':
 
     p1 = Player('Player One')
     p1.random_layout(deepcopy(fleet))
-    p2 = RandomAIPlayer('Player Two')
+    p2 = HuntTargetAIPlayer('Player Two')
     p2.random_layout(deepcopy(fleet))
 
     game = Game(p1, p2)
+    scheduler = MoveScheduler(max_workers=1)
 
     playing = True
     render_views(game)
     while playing:
         if isinstance(game.current_player, AIPlayer):
-            command = game.current_player.next_target()
+            move = scheduler.request_move(game.current_player, session=game)
             print('\n{0} is choosing a target'.format(game.current_player), end='')
-            for _ in range(3):
-                sleep(1)
+            while not move.wait(0.5):
                 print('.',end='',flush=True)
+            command = move.result()
             print(command)
-            sleep(0.75)
         else:
             valid_coord = False
             while playing and not valid_coord:
@@ -140,6 +140,8 @@ if __name__ == '__main__':
                 print('\n{0} has already been attacked.'.format(command))
             else:
                 print('\n{0}: {1}'.format(command, outcome))
+                if isinstance(game.current_player, AIPlayer):
+                    game.current_player.record_outcome(command, outcome)
                 won = outcome.is_game_over()
                 if won:
                     print("\n{0} is the winner!".format(game.current_player))
@@ -147,4 +149,6 @@ if __name__ == '__main__':
                 render_views(game)
                 game.next_player()
 
+    scheduler.cancel_session(game)
+    scheduler.shutdown()
     print('\n')
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+
+import os
+
+import numpy as np
+
+from engine import fleet, grid_masks
+
+
+SNAPSHOT_VERSION = 1
+
+
+class IncompatibleSnapshot(Exception):
+
+    """Raised when a snapshot was written for a different fleet or grid."""
+
+    def __init__(self, path):
+        """Allocates a new instance.
+
+        :param path: path of the rejected snapshot
+        :return: new instance
+        """
+        self.path = path
+
+    def __str__(self):
+        return "Snapshot {0} does not match this fleet and grid.".format(self.path)
+
+
+class PlacementPrior:
+
+    """Learns where opponents place their ships from completed games.
+
+    Keeps, for every grid space, how often a ship covered it, and for every
+    ship how often each of its placements (origin and orientation) was
+    chosen. observe() costs O(ship size) per ship. cell_prior() exports the
+    probability that each grid space holds a ship, blending the counts with
+    the occupancy expected of uniformly random placements so that the prior
+    starts uniform and sharpens as games are observed; probability() then
+    answers in O(1) per grid space.
+
+    All counts live in a single int64 array that snapshot() writes to disk
+    and load() memory-maps copy-on-write at startup:
+
+        [version, games, cells, ships, cell counts..., placement counts...]
+    """
+
+    def __init__(self, ships=fleet, dimension=(8, 8), smoothing=10.0,
+                 snapshot_path=None, snapshot_every=None, counts=None):
+        """Allocates a new instance.
+
+        :param ships: the fleet opponents lay out
+        :param dimension: rows and columns of the battle grid
+        :param smoothing: weight, in games, of the uniform placement prior
+        :param snapshot_path: optional path snapshot() writes to
+        :param snapshot_every: optional number of games between automatic
+                               snapshots; requires snapshot_path
+        :param counts: optional count array, as memory-mapped by load()
+        :return: new instance
+        """
+        if snapshot_every and snapshot_path is None:
+            raise ValueError('Automatic snapshots need a snapshot_path.')
+
+        self.ship_names = [ship.name for ship in ships]
+        self.ship_sizes = [ship.size for ship in ships]
+        self.masks = grid_masks(dimension)
+        self.smoothing = smoothing
+        self.snapshot_path = snapshot_path
+        self.snapshot_every = snapshot_every
+
+        cell_count = len(self.masks.coords)
+        self._header = 4
+        self._placement_offsets = []
+        offset = self._header + cell_count
+        for size in self.ship_sizes:
+            self._placement_offsets.append(offset)
+            offset += len(self.masks.placements(size))
+
+        if counts is None:
+            counts = np.zeros(offset, dtype=np.int64)
+            counts[:self._header] = (SNAPSHOT_VERSION, 0, cell_count, len(self.ship_names))
+        elif (len(counts) != offset or counts[0] != SNAPSHOT_VERSION or
+              counts[2] != cell_count or counts[3] != len(self.ship_names)):
+            raise IncompatibleSnapshot(snapshot_path)
+
+        self.counts = counts
+        self.cell_counts = counts[self._header:self._header + cell_count]
+        self._ship_index = {name: index for index, name in enumerate(self.ship_names)}
+
+        self._uniform = self._uniform_occupancy()
+        self._prior = None
+
+    @property
+    def games(self):
+        return int(self.counts[1])
+
+    def observe(self, battle_grid):
+        """Counts the layout of a battle grid from a completed game.
+
+        Ships not in this prior's fleet are ignored, as are grids laid out
+        without place_ship() or random_layout().
+
+        :param battle_grid: the BattleGrid whose placements to count
+        """
+        if not battle_grid.placements:
+            return
+
+        for ship, placement in battle_grid.placements:
+            index = self._ship_index.get(ship.name)
+            if index is None:
+                continue
+
+            self.counts[self._placement_offsets[index] + placement.number] += 1
+            for cell in placement.indexes:
+                self.cell_counts[cell] += 1
+
+        self.counts[1] += 1
+        self._prior = None
+
+        if self.snapshot_every and self.games % self.snapshot_every == 0:
+            self.snapshot()
+
+    def cell_prior(self):
+        """Calculates the probability that each grid space holds a ship.
+
+        :return: float array of row-major grid space probabilities
+        """
+        if self._prior is None:
+            self._prior = ((self.cell_counts + self.smoothing * self._uniform) /
+                           (self.games + self.smoothing))
+        return self._prior
+
+    def probability(self, coord):
+        """Looks up the probability that a grid space holds a ship.
+
+        :param coord: player co-ordinate, e.g. 'A7'
+        :return: probability between 0 and 1
+        """
+        return self.cell_prior()[self.masks.index[coord]]
+
+    def placement_counts(self, ship_name):
+        """Returns how often each placement of a ship was observed.
+
+        :param ship_name: name of a ship in the fleet
+        :return: int array indexed by Placement.number
+        """
+        index = self._ship_index[ship_name]
+        start = self._placement_offsets[index]
+        return self.counts[start:start + len(self.masks.placements(self.ship_sizes[index]))]
+
+    def snapshot(self, path=None):
+        """Writes the counts to disk, replacing any earlier snapshot.
+
+        :param path: optional path; snapshot_path when None
+        """
+        path = path or self.snapshot_path
+        if path is None:
+            raise ValueError('No snapshot path given.')
+
+        temporary = '{0}.{1}.tmp'.format(path, os.getpid())
+
+        with open(temporary, 'wb') as snapshot_file:
+            np.save(snapshot_file, np.asarray(self.counts))
+        os.replace(temporary, path)
+
+    @staticmethod
+    def load(path, ships=fleet, dimension=(8, 8), **kwargs):
+        """Memory-maps a snapshot, copy-on-write, to continue learning from it.
+
+        :param path: path of a snapshot written by snapshot()
+        :param ships: the fleet the snapshot was learned for
+        :param dimension: rows and columns of the battle grid
+        :param kwargs: further PlacementPrior arguments
+        :return: new PlacementPrior instance
+        """
+        counts = np.load(path, mmap_mode='c')
+        kwargs.setdefault('snapshot_path', path)
+        return PlacementPrior(ships, dimension, counts=counts, **kwargs)
+
+    def _uniform_occupancy(self):
+        """Expected ships per grid space if each ship were placed uniformly."""
+        occupancy = np.zeros(len(self.masks.coords))
+        for size in self.ship_sizes:
+            placements = self.masks.placements(size)
+            for placement in placements:
+                occupancy[placement.indexes] += 1.0 / len(placements)
+        return occupancy
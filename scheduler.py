@@ -0,0 +1,343 @@
+#!/usr/bin/env python
+
+import asyncio
+import threading
+
+from concurrent.futures import (CancelledError, Future, ThreadPoolExecutor,
+                                TimeoutError, wait)
+from time import monotonic
+
+from engine import AIPlayer
+
+
+def searches_in_place(player):
+    """Tests whether a player's search runs on the player itself.
+
+    Players overriding AIPlayer.search_target() offer targets as they go,
+    changing their own state, and must stop once cancelled. Other players
+    are searched on a copy, which is only adopted when its target is used.
+
+    :param player: an AIPlayer
+    :return: True when the player's search runs in place
+    """
+    return type(player).search_target is not AIPlayer.search_target
+
+
+class TargetSearch:
+
+    """Collects the targets an AI player offers while computing a move.
+
+    Players offer improving targets through offer() and should stop
+    searching once cancelled is set; offers made after cancellation are
+    ignored.
+    """
+
+    def __init__(self, commit=None):
+        """Allocates a new instance.
+
+        :param commit: optional callable run with each accepted offer,
+                       before cancel() can return
+        :return: new instance
+        """
+        self.best = None
+        self.cancelled = False
+        self._commit = commit
+        self._lock = threading.Lock()
+
+    def offer(self, coord):
+        """Records the best target found so far.
+
+        :param coord: player co-ordinate to attack
+        :return: True when accepted; False once the search is cancelled
+        """
+        with self._lock:
+            if self.cancelled:
+                return False
+            if self._commit is not None:
+                self._commit()
+            self.best = coord
+            return True
+
+    def cancel(self):
+        """Stops the search, freezing the best target found so far.
+
+        :return: the best target found, or None
+        """
+        with self._lock:
+            self.cancelled = True
+            return self.best
+
+
+class MoveRequest:
+
+    """A pending AI move that resolves by its deadline.
+
+    When the player has not finished by the deadline, the move resolves to
+    the best target it offered so far or to the player's fallback_target().
+    A search run on a copy of the player is simply abandoned; a search run
+    in place is first left to stop, as it changes the player.
+
+    Errors raised by the player's search are raised by result().
+    """
+
+    def __init__(self, player, deadline, session=None, search=None):
+        """Allocates a new instance.
+
+        :param player: the AIPlayer choosing a target
+        :param deadline: monotonic time by which the move must resolve
+        :param session: optional key used to cancel the request
+        :param search: optional TargetSearch collecting the player's offers
+        :return: new instance
+        """
+        self.player = player
+        self.deadline = deadline
+        self.session = session
+        self.search = search if search is not None else TargetSearch()
+        self.future = Future()
+        self.previous = None
+        self._target = None
+        self._cancelled = False
+        self._lock = threading.Lock()
+
+    def done(self):
+        """Tests whether the move has resolved or been cancelled.
+
+        :return: True when result() will not block; False otherwise
+        """
+        return (self._cancelled or self._target is not None or
+                self.future.done() or monotonic() >= self.deadline)
+
+    def wait(self, timeout=None):
+        """Waits for the move to be computed or its deadline to pass.
+
+        :param timeout: optional seconds to wait
+        :return: True when result() will not block; False otherwise
+        """
+        remaining = self.deadline - monotonic()
+        if timeout is not None:
+            remaining = min(remaining, timeout)
+
+        try:
+            self.future.result(max(remaining, 0))
+        except (CancelledError, TimeoutError):
+            pass
+
+        return self.done()
+
+    def result(self):
+        """Returns the target, blocking until the move is computed or due.
+
+        :return: player co-ordinate to attack
+        """
+        self.wait()
+
+        with self._lock:
+            if self._cancelled:
+                raise CancelledError()
+
+            if self._target is None:
+                self._target = self._resolve()
+
+            return self._target
+
+    async def result_async(self):
+        """Returns the target without blocking the running event loop.
+
+        :return: player co-ordinate to attack
+        """
+        remaining = self.deadline - monotonic()
+
+        if remaining > 0 and not self.future.done():
+            await asyncio.wait({asyncio.wrap_future(self.future)},
+                               timeout=remaining)
+
+        return self.result()
+
+    def cancel(self):
+        """Abandons the move, stopping the player's search."""
+        with self._lock:
+            self._cancelled = True
+            self.search.cancel()
+            self.future.cancel()
+
+    def previous_search(self):
+        """Returns the request whose search must end before this one starts.
+
+        Requests cancelled before starting are skipped, as they never ran.
+
+        :return: a MoveRequest, or None
+        """
+        previous = self.previous
+        while previous is not None and previous.future.cancelled():
+            previous = previous.previous
+        return previous
+
+    def _resolve(self):
+        """Settles the target once the search is done or the deadline passed."""
+        in_place = searches_in_place(self.player)
+
+        if self.future.cancel():
+            # never started; an in place search before it may still be stopping
+            previous = self.previous_search()
+            if in_place and previous is not None:
+                wait([previous.future])
+            return self.player.fallback_target()
+
+        best = self.search.cancel()
+        if best is None and in_place:
+            # let the search stop changing the player before it falls back
+            wait([self.future])
+
+        if self.future.done() and self.future.exception() is not None:
+            raise self.future.exception()
+        if best is not None:
+            return best
+
+        return self.player.fallback_target()
+
+
+class MoveScheduler:
+
+    """Computes AI moves on a thread pool, each bounded by a deadline.
+
+    Callers receive a MoveRequest immediately and collect its target with
+    result() or, from asyncio code, result_async(). Requests made for a
+    session can be cancelled together with cancel_session() when the
+    session ends.
+
+    By default a move is searched on a copy of the player taken when it is
+    requested, and the player adopts the copy only if its target is used,
+    so a search abandoned at its deadline leaves the player untouched.
+    Players that search in place search one move at a time: a request made
+    while such a search is running is queued once that search ends, without
+    holding a worker thread while it waits.
+    """
+
+    def __init__(self, max_workers=4, deadline=1.0):
+        """Allocates a new instance.
+
+        :param max_workers: number of threads computing moves
+        :param deadline: default seconds allowed to compute a move
+        :return: new instance
+        """
+        self.deadline = deadline
+        self._executor = ThreadPoolExecutor(max_workers, 'ai-move')
+        self._sessions = {}
+        self._searches = {}
+        self._lock = threading.Lock()
+
+    def request_move(self, player, deadline=None, session=None):
+        """Starts computing the next target of an AI player.
+
+        :param player: the AIPlayer choosing a target
+        :param deadline: optional seconds allowed, overriding the default
+        :param session: optional key grouping requests for cancel_session()
+        :return: a MoveRequest
+        """
+        allowed = self.deadline if deadline is None else deadline
+
+        if searches_in_place(player):
+            searcher = player
+            search = TargetSearch()
+        else:
+            searcher = player.copy_for_search()
+            search = TargetSearch(lambda: player.adopt(searcher))
+
+        request = MoveRequest(player, monotonic() + allowed, session, search)
+
+        with self._lock:
+            if searcher is player:
+                searching = self._searches.get(id(player))
+                if searching is not None:
+                    request.previous = searching[1]
+                self._searches[id(player)] = (player, request)
+
+            if session is not None:
+                self._sessions.setdefault(session, set()).add(request)
+
+        request.future.add_done_callback(lambda _: self._forget(request))
+        self._start_after_previous(request, searcher)
+
+        return request
+
+    def next_target(self, player, deadline=None, session=None):
+        """Computes the next target of an AI player, blocking until it is due.
+
+        :param player: the AIPlayer choosing a target
+        :param deadline: optional seconds allowed, overriding the default
+        :param session: optional key grouping requests for cancel_session()
+        :return: player co-ordinate to attack
+        """
+        return self.request_move(player, deadline, session).result()
+
+    async def next_target_async(self, player, deadline=None, session=None):
+        """Computes the next target of an AI player from asyncio code.
+
+        :param player: the AIPlayer choosing a target
+        :param deadline: optional seconds allowed, overriding the default
+        :param session: optional key grouping requests for cancel_session()
+        :return: player co-ordinate to attack
+        """
+        return await self.request_move(player, deadline, session).result_async()
+
+    def cancel_session(self, session):
+        """Cancels every pending request made for a session.
+
+        :param session: the key passed when requesting moves
+        """
+        with self._lock:
+            requests = self._sessions.pop(session, set())
+
+        for request in requests:
+            request.cancel()
+
+    def shutdown(self):
+        """Cancels queued requests and stops the worker threads."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _start_after_previous(self, request, searcher):
+        """Queues a search once the player's previous search has ended."""
+        previous = request.previous_search()
+        if previous is None or previous.future.done():
+            request.previous = None
+            self._start(request, searcher)
+        else:
+            previous.future.add_done_callback(
+                lambda _: self._start_after_previous(request, searcher))
+
+    def _start(self, request, searcher):
+        try:
+            self._executor.submit(self._search, request, searcher)
+        except RuntimeError:
+            # the scheduler has been shut down
+            request.future.cancel()
+
+    def _search(self, request, searcher):
+        if not request.future.set_running_or_notify_cancel():
+            return
+
+        try:
+            if not request.search.cancelled:
+                searcher.search_target(request.search)
+        except BaseException as error:
+            request.future.set_exception(error)
+        else:
+            request.future.set_result(None)
+
+    def _forget(self, request):
+        with self._lock:
+            searching = self._searches.get(id(request.player))
+            if searching is not None and searching[1] is request:
+                # a request cancelled before starting hands the player's
+                # running search back to the next request
+                previous = request.previous_search()
+                if previous is not None and not previous.future.done():
+                    self._searches[id(request.player)] = (request.player, previous)
+                else:
+                    del self._searches[id(request.player)]
+
+            requests = self._sessions.get(request.session)
+            if requests is not None:
+                requests.discard(request)
+                if not requests:
+                    del self._sessions[request.session]
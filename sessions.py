@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+
+import os
+import pickle
+import threading
+import zlib
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import quote
+
+
+class UnknownSession(Exception):
+
+    """Raised when a session is neither in memory nor on disk."""
+
+    def __init__(self, session_id):
+        """Allocates a new instance.
+
+        :param session_id: the id of the missing session
+        :return: new instance
+        """
+        self.session_id = session_id
+
+    def __str__(self):
+        return "Session {0} does not exist.".format(self.session_id)
+
+
+class SessionExists(Exception):
+
+    """Raised when adding a session under an id that is already registered."""
+
+    def __init__(self, session_id):
+        """Allocates a new instance.
+
+        :param session_id: the id already in use
+        :return: new instance
+        """
+        self.session_id = session_id
+
+    def __str__(self):
+        return "Session {0} already exists.".format(self.session_id)
+
+
+class SessionManager:
+
+    """Keeps recently active games in memory and the rest on disk.
+
+    At most max_sessions games, or games totalling max_bytes, stay resident.
+    Beyond that the least recently used games are evicted to store_dir as
+    compressed pickles and transparently reloaded by their next turn. A
+    game's size is estimated from its pickled size when it becomes resident.
+
+    Each session has a lock held while it takes a turn, is evicted or is
+    reloaded. Subscriptions to a game's events are kept across eviction.
+    Callers should go through take_turn(), next_player() and play_turn()
+    rather than hold on to a Game, which may be evicted at any time.
+    """
+
+    def __init__(self, store_dir, max_sessions=None, max_bytes=None):
+        """Allocates a new instance.
+
+        :param store_dir: directory holding evicted sessions
+        :param max_sessions: optional maximum number of resident sessions
+        :param max_bytes: optional maximum estimated bytes of resident sessions
+        :return: new instance
+        """
+        os.makedirs(store_dir, exist_ok=True)
+
+        self.store_dir = store_dir
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.resident_bytes = 0
+
+        self._resident = OrderedDict()
+        self._sizes = {}
+        self._buses = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._locks)
+
+    def __contains__(self, session_id):
+        return session_id in self._locks
+
+    def add(self, session_id, game):
+        """Registers a new session.
+
+        Raises SessionExists when the id is already registered; remove() the
+        old session first to replace it.
+
+        :param session_id: string id of the session
+        :param game: the session's Game
+        """
+        size = len(self._serialize(game))
+
+        with self._lock:
+            if session_id in self._locks:
+                raise SessionExists(session_id)
+            self._locks[session_id] = threading.Lock()
+            self._make_resident(session_id, game, size)
+
+        self._evict_over_budget()
+
+    def remove(self, session_id):
+        """Forgets a session, deleting it from memory and disk.
+
+        :param session_id: id of the session
+        """
+        with self._session_lock(session_id):
+            with self._lock:
+                if session_id in self._resident:
+                    del self._resident[session_id]
+                    self.resident_bytes -= self._sizes.pop(session_id)
+                self._buses.pop(session_id, None)
+                del self._locks[session_id]
+
+            try:
+                os.remove(self._path(session_id))
+            except FileNotFoundError:
+                pass
+
+    def take_turn(self, session_id, coord):
+        """Takes a turn in a session, reloading it from disk when evicted.
+
+        :param session_id: id of the session
+        :param coord: the player co-ordinate being attacked
+        :return: the Outcome of Game.take_turn
+        """
+        return self._call(session_id, lambda game: game.take_turn(coord))
+
+    def play_turn(self, session_id, player_name, coord):
+        """Takes a whole turn for a named player as one atomic step.
+
+        :param session_id: id of the session
+        :param player_name: name of the player taking the turn
+        :param coord: the player co-ordinate being attacked
+        :return: the Outcome of Game.play_turn
+        """
+        def play(game):
+            if game.human.name == player_name:
+                player = game.human
+            elif game.computer.name == player_name:
+                player = game.computer
+            else:
+                raise ValueError('No player named {0}.'.format(player_name))
+            return game.play_turn(player, coord)
+
+        return self._call(session_id, play)
+
+    def next_player(self, session_id):
+        """Passes the turn in a session to the other player.
+
+        :param session_id: id of the session
+        :return: the new current player
+        """
+        return self._call(session_id, lambda game: game.next_player())
+
+    def is_resident(self, session_id):
+        """Tests whether a session is currently held in memory.
+
+        :param session_id: id of the session
+        :return: True when resident; False when evicted to disk
+        """
+        return session_id in self._resident
+
+    def metrics(self):
+        """Reports cache activity.
+
+        :return: dict of hits, misses, evictions, resident and total
+                 sessions and estimated resident bytes
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions,
+                    'resident': len(self._resident), 'sessions': len(self._locks),
+                    'resident_bytes': self.resident_bytes}
+
+    def evict(self, session_id):
+        """Writes a resident session to disk and drops it from memory.
+
+        :param session_id: id of the session
+        """
+        with self._session_lock(session_id):
+            self._evict_locked(session_id)
+
+    def _call(self, session_id, action):
+        with self._session_lock(session_id):
+            game = self._acquire(session_id)
+            result = action(game)
+
+        self._evict_over_budget()
+        return result
+
+    @contextmanager
+    def _session_lock(self, session_id):
+        """Holds a session's lock; raises UnknownSession once it is removed."""
+        lock = self._locks.get(session_id)
+        if lock is None:
+            raise UnknownSession(session_id)
+
+        with lock:
+            if self._locks.get(session_id) is not lock:
+                raise UnknownSession(session_id)
+            yield
+
+    def _acquire(self, session_id):
+        """Returns a session's game, loading it when evicted.
+
+        Must be called holding the session lock.
+        """
+        with self._lock:
+            game = self._resident.get(session_id)
+            if game is not None:
+                self._resident.move_to_end(session_id)
+                self.hits += 1
+                return game
+            self.misses += 1
+
+        with open(self._path(session_id), 'rb') as session_file:
+            data = zlib.decompress(session_file.read())
+        game = pickle.loads(data)
+
+        with self._lock:
+            game.events = self._buses.pop(session_id, game.events)
+            self._make_resident(session_id, game, len(data))
+
+        os.remove(self._path(session_id))
+        return game
+
+    def _make_resident(self, session_id, game, size):
+        self._resident[session_id] = game
+        self._sizes[session_id] = size
+        self.resident_bytes += size
+
+    def _over_budget(self):
+        return ((self.max_sessions is not None and len(self._resident) > self.max_sessions) or
+                (self.max_bytes is not None and self.resident_bytes > self.max_bytes))
+
+    def _evict_over_budget(self):
+        """Evicts least recently used sessions until within budget.
+
+        Sessions that are busy are skipped; they are in active use.
+        """
+        while True:
+            with self._lock:
+                if not self._over_budget():
+                    return
+                candidates = list(self._resident)
+
+            for session_id in candidates:
+                lock = self._locks.get(session_id)
+                if lock is not None and lock.acquire(blocking=False):
+                    try:
+                        self._evict_locked(session_id)
+                    finally:
+                        lock.release()
+                    break
+            else:
+                return
+
+    def _evict_locked(self, session_id):
+        """Evicts a session; must be called holding its session lock."""
+        with self._lock:
+            game = self._resident.get(session_id)
+            if game is None:
+                return
+
+        data = self._serialize(game)
+        path = self._path(session_id)
+        temporary = path + '.tmp'
+        with open(temporary, 'wb') as session_file:
+            session_file.write(zlib.compress(data))
+        os.replace(temporary, path)
+
+        with self._lock:
+            del self._resident[session_id]
+            self.resident_bytes -= self._sizes.pop(session_id)
+            if game.events.subscriptions:
+                self._buses[session_id] = game.events
+            self.evictions += 1
+
+    def _serialize(self, game):
+        return pickle.dumps(game, pickle.HIGHEST_PROTOCOL)
+
+    def _path(self, session_id):
+        return os.path.join(self.store_dir, quote(str(session_id), safe='') + '.game')
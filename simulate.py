@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+
+"""Sharded AI-vs-AI simulation over a shared directory work queue.
+
+A coordinator splits a job (a pair of AI strategies and a range of seeds)
+into shard files under a queue directory that every machine can reach:
+
+    queue/job.json        strategies, seed range and shard count
+    queue/pending/        shards waiting for a worker
+    queue/claimed/        shards being played; mtime is the worker heartbeat
+    queue/results/        compact per-shard results (.npz)
+
+Workers claim a shard by renaming it from pending/ to claimed/, which only
+one worker can do. A claimed shard whose heartbeat goes stale, e.g. because
+its worker crashed, is moved back to pending/ by the coordinator. Games are
+seeded, so a shard played twice produces the same result.
+
+    python simulate.py create queue --first hunt --second random --seeds 0:100000
+    python simulate.py work queue              # on each worker machine
+    python simulate.py watch queue             # requeue stale shards, then merge
+    python simulate.py local queue --first hunt --second random --seeds 0:2000 --workers 4
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import sys
+
+from multiprocessing import Process
+from time import sleep, time
+
+import numpy as np
+
+from engine import HuntTargetAIPlayer, Game, RandomAIPlayer
+from stats import GameStats
+
+
+STRATEGIES = {
+    'random': RandomAIPlayer,
+    'hunt': HuntTargetAIPlayer,
+}
+
+ROLES = ('first', 'second')
+
+
+class Job:
+
+    """The layout of a simulation job in its queue directory."""
+
+    def __init__(self, queue_dir):
+        """Allocates a new instance.
+
+        :param queue_dir: path of the shared queue directory
+        :return: new instance
+        """
+        self.queue_dir = queue_dir
+        self.pending_dir = os.path.join(queue_dir, 'pending')
+        self.claimed_dir = os.path.join(queue_dir, 'claimed')
+        self.results_dir = os.path.join(queue_dir, 'results')
+        self.job_path = os.path.join(queue_dir, 'job.json')
+
+    def create(self, first, second, seed_start, seed_stop, shard_size):
+        """Writes the job description and one pending file per shard.
+
+        :param first: strategy name of the player moving first
+        :param second: strategy name of the player moving second
+        :param seed_start: first game seed
+        :param seed_stop: seed after the last game seed
+        :param shard_size: number of games per shard
+        :return: number of shards
+        """
+        for strategy in (first, second):
+            if strategy not in STRATEGIES:
+                raise ValueError('Unknown strategy {0}.'.format(strategy))
+
+        for directory in (self.pending_dir, self.claimed_dir, self.results_dir):
+            os.makedirs(directory, exist_ok=True)
+
+        shards = []
+        for start in range(seed_start, seed_stop, shard_size):
+            shard = {'first': first, 'second': second,
+                     'seed_start': start, 'seed_stop': min(start + shard_size, seed_stop)}
+            name = 'shard-{0:06d}.json'.format(len(shards))
+            _write_atomically(os.path.join(self.pending_dir, name),
+                              json.dumps(shard).encode())
+            shards.append(name)
+
+        _write_atomically(self.job_path, json.dumps({
+            'first': first, 'second': second, 'seed_start': seed_start,
+            'seed_stop': seed_stop, 'shards': len(shards)}).encode())
+
+        return len(shards)
+
+    def describe(self):
+        """Reads the job description.
+
+        :return: dict written by create()
+        """
+        with open(self.job_path) as job_file:
+            return json.load(job_file)
+
+    def pending(self):
+        return sorted(name for name in os.listdir(self.pending_dir) if name.endswith('.json'))
+
+    def claimed(self):
+        return sorted(name for name in os.listdir(self.claimed_dir) if name.endswith('.json'))
+
+    def results(self):
+        return sorted(name for name in os.listdir(self.results_dir) if name.endswith('.npz'))
+
+    def is_complete(self):
+        """Tests whether every shard has a result.
+
+        :return: True when complete; False otherwise
+        """
+        return len(self.results()) >= self.describe()['shards']
+
+    def claim(self):
+        """Claims the next pending shard.
+
+        :return: the shard name, or None when nothing is pending
+        """
+        for name in self.pending():
+            try:
+                os.rename(os.path.join(self.pending_dir, name),
+                          os.path.join(self.claimed_dir, name))
+            except FileNotFoundError:
+                continue
+            self.heartbeat(name)
+            return name
+
+        return None
+
+    def heartbeat(self, name):
+        """Records that the worker playing a claimed shard is alive.
+
+        :param name: the claimed shard name
+        """
+        try:
+            os.utime(os.path.join(self.claimed_dir, name))
+        except FileNotFoundError:
+            pass
+
+    def requeue_stale(self, timeout):
+        """Moves claimed shards without a recent heartbeat back to pending.
+
+        :param timeout: seconds since the last heartbeat after which a
+                        worker is presumed dead
+        :return: list of requeued shard names
+        """
+        requeued = []
+        now = time()
+
+        for name in self.claimed():
+            path = os.path.join(self.claimed_dir, name)
+            try:
+                stale = now - os.path.getmtime(path) > timeout
+                if stale:
+                    os.rename(path, os.path.join(self.pending_dir, name))
+                    requeued.append(name)
+            except FileNotFoundError:
+                continue
+
+        return requeued
+
+    def play(self, name, heartbeat_every=1.0):
+        """Plays every game of a claimed shard and writes its result.
+
+        :param name: the claimed shard name
+        :param heartbeat_every: seconds between heartbeats
+        """
+        with open(os.path.join(self.claimed_dir, name)) as shard_file:
+            shard = json.load(shard_file)
+
+        accumulators = {role: GameStats() for role in ROLES}
+        wins = {role: 0 for role in ROLES}
+        last_heartbeat = time()
+
+        for seed in range(shard['seed_start'], shard['seed_stop']):
+            winner = play_game(shard['first'], shard['second'], seed, accumulators)
+            wins[winner] += 1
+
+            if time() - last_heartbeat > heartbeat_every:
+                self.heartbeat(name)
+                last_heartbeat = time()
+
+        arrays = {'{0}_wins'.format(role): np.array(wins[role]) for role in ROLES}
+        for role in ROLES:
+            for key, value in accumulators[role].to_arrays().items():
+                arrays['{0}_{1}'.format(role, key)] = value
+
+        result_name = name.replace('.json', '.npz')
+        temporary = os.path.join(self.results_dir, '.{0}.{1}.tmp'.format(result_name, _worker_id()))
+        with open(temporary, 'wb') as result_file:
+            np.savez_compressed(result_file, **arrays)
+        os.replace(temporary, os.path.join(self.results_dir, result_name))
+
+        try:
+            os.remove(os.path.join(self.claimed_dir, name))
+        except FileNotFoundError:
+            pass
+
+    def merge(self):
+        """Merges every shard result into one report.
+
+        :return: dict with the job description, wins and GameStats per role
+        """
+        report = dict(self.describe())
+        report['games'] = 0
+        report['wins'] = {role: 0 for role in ROLES}
+        report['stats'] = {role: GameStats() for role in ROLES}
+
+        for name in self.results():
+            with np.load(os.path.join(self.results_dir, name)) as arrays:
+                for role in ROLES:
+                    prefix = '{0}_'.format(role)
+                    role_arrays = {key[len(prefix):]: arrays[key]
+                                   for key in arrays.files if key.startswith(prefix)}
+                    report['wins'][role] += int(role_arrays['wins'])
+                    report['stats'][role].merge(GameStats.from_arrays(role_arrays))
+
+        report['games'] = sum(report['wins'].values())
+
+        return report
+
+
+def play_game(first, second, seed, accumulators):
+    """Plays one seeded AI-vs-AI game.
+
+    The engine draws layouts and AI choices from the module-global random
+    generator, so the game reseeds it. Its previous state is restored
+    afterwards, but other threads of the process drawing from it while the
+    game is played both disturb the game and see the seeded sequence.
+
+    :param first: strategy name of the player moving first
+    :param second: strategy name of the player moving second
+    :param seed: seed for the layouts and the players' choices
+    :param accumulators: GameStats keyed by role, updated with each shot
+    :return: the role of the winner, 'first' or 'second'
+    """
+    state = random.getstate()
+    random.seed(seed)
+
+    try:
+        players = {'first': STRATEGIES[first]('first'), 'second': STRATEGIES[second]('second')}
+        roles = {id(player): role for role, player in players.items()}
+        for player in players.values():
+            player.random_layout()
+
+        game = Game(players['first'], players['second'])
+
+        while True:
+            player = game.current_player
+            role = roles[id(player)]
+            coord = player.next_target()
+            outcome = game.play_turn(player, coord)
+            player.record_outcome(coord, outcome)
+            accumulators[role].record(coord, outcome)
+
+            if outcome.is_game_over():
+                for accumulator in accumulators.values():
+                    accumulator.end_game()
+                return role
+    finally:
+        random.setstate(state)
+
+
+def run_worker(queue_dir, poll=0.5, exit_when_idle=False):
+    """Claims and plays shards until the job is complete.
+
+    :param queue_dir: path of the shared queue directory
+    :param poll: seconds to wait when nothing is pending
+    :param exit_when_idle: return once nothing is pending; otherwise keep
+                           polling until the job is complete
+    :return: number of shards played
+    """
+    job = Job(queue_dir)
+    played = 0
+
+    while True:
+        name = job.claim()
+
+        if name is not None:
+            job.play(name)
+            played += 1
+        elif exit_when_idle or job.is_complete():
+            return played
+        else:
+            sleep(poll)
+
+
+def watch(queue_dir, stale_timeout=60.0, poll=1.0):
+    """Requeues stale shards until every shard has a result.
+
+    :param queue_dir: path of the shared queue directory
+    :param stale_timeout: seconds without heartbeat before requeueing
+    :param poll: seconds between checks
+    :return: the merged report
+    """
+    job = Job(queue_dir)
+
+    while not job.is_complete():
+        job.requeue_stale(stale_timeout)
+        sleep(poll)
+
+    return job.merge()
+
+
+def run_local(queue_dir, first, second, seed_start, seed_stop, shard_size=100,
+              workers=2, stale_timeout=60.0, poll=0.2):
+    """Runs a whole job with worker processes on this machine.
+
+    Worker processes that exit while shards are still pending, e.g. after a
+    crash, are replaced.
+
+    :param queue_dir: path of the queue directory to create
+    :param first: strategy name of the player moving first
+    :param second: strategy name of the player moving second
+    :param seed_start: first game seed
+    :param seed_stop: seed after the last game seed
+    :param shard_size: number of games per shard
+    :param workers: number of worker processes
+    :param stale_timeout: seconds without heartbeat before requeueing
+    :param poll: seconds between checks
+    :return: the merged report
+    """
+    job = Job(queue_dir)
+    if not os.path.exists(job.job_path):
+        job.create(first, second, seed_start, seed_stop, shard_size)
+
+    processes = []
+    while not job.is_complete():
+        job.requeue_stale(stale_timeout)
+
+        processes = [process for process in processes if process.is_alive()]
+        if job.pending():
+            for _ in range(workers - len(processes)):
+                process = Process(target=run_worker, args=(queue_dir, poll, True))
+                process.start()
+                processes.append(process)
+
+        sleep(poll)
+
+    for process in processes:
+        process.join()
+
+    return job.merge()
+
+
+def format_report(report):
+    """Formats a merged report for display.
+
+    :param report: dict returned by Job.merge()
+    :return: list of lines
+    """
+    lines = ['{0} vs {1}, seeds {2}:{3}, {4} games'.format(
+        report['first'], report['second'], report['seed_start'],
+        report['seed_stop'], report['games'])]
+
+    for role in ROLES:
+        accumulator = report['stats'][role]
+        lines.append('{0:>7} {1:<7} wins {2:>7}  mean shots to win {3:6.2f}'.format(
+            role, report[role], report['wins'][role], accumulator.mean_shots_to_win()))
+
+    return lines
+
+
+def _write_atomically(path, data):
+    temporary = '{0}.{1}.tmp'.format(path, _worker_id())
+    with open(temporary, 'wb') as output:
+        output.write(data)
+    os.replace(temporary, path)
+
+
+def _worker_id():
+    return '{0}-{1}'.format(socket.gethostname(), os.getpid())
+
+
+def _seed_range(text):
+    (start, stop) = text.split(':')
+    return (int(start), int(stop))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    for command in ('create', 'local'):
+        subparser = commands.add_parser(command)
+        subparser.add_argument('queue_dir')
+        subparser.add_argument('--first', choices=sorted(STRATEGIES), default='hunt')
+        subparser.add_argument('--second', choices=sorted(STRATEGIES), default='random')
+        subparser.add_argument('--seeds', type=_seed_range, default=(0, 1000),
+                               help='seed range as start:stop')
+        subparser.add_argument('--shard-size', type=int, default=100)
+        if command == 'local':
+            subparser.add_argument('--workers', type=int, default=os.cpu_count())
+
+    work = commands.add_parser('work')
+    work.add_argument('queue_dir')
+    work.add_argument('--exit-when-idle', action='store_true',
+                      help='return once no shard is pending instead of waiting '
+                           'for requeued shards until the job completes')
+
+    watch_parser = commands.add_parser('watch')
+    watch_parser.add_argument('queue_dir')
+    watch_parser.add_argument('--stale-timeout', type=float, default=60.0)
+
+    merge_parser = commands.add_parser('merge')
+    merge_parser.add_argument('queue_dir')
+
+    args = parser.parse_args()
+
+    if args.command == 'create':
+        shards = Job(args.queue_dir).create(args.first, args.second, args.seeds[0],
+                                            args.seeds[1], args.shard_size)
+        print('Created {0} shards.'.format(shards))
+        sys.exit(0)
+    elif args.command == 'work':
+        played = run_worker(args.queue_dir, exit_when_idle=args.exit_when_idle)
+        print('Played {0} shards.'.format(played))
+        sys.exit(0)
+    elif args.command == 'watch':
+        report = watch(args.queue_dir, args.stale_timeout)
+    elif args.command == 'merge':
+        report = Job(args.queue_dir).merge()
+    else:
+        report = run_local(args.queue_dir, args.first, args.second, args.seeds[0],
+                           args.seeds[1], args.shard_size, args.workers)
+
+    print('\n'.join(format_report(report)))
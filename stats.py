@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+import numpy as np
+
+from engine import COORD_INDEX, COORDS, OutcomeState, fleet
+
+
+class IncompatibleStats(Exception):
+
+    """Raised when merging accumulators with different shapes or fleets."""
+
+    def __init__(self, ship_names, other_ship_names):
+        """Allocates a new instance.
+
+        :param ship_names: ship names of the accumulator being merged into
+        :param other_ship_names: ship names of the accumulator being merged
+        :return: new instance
+        """
+        self.ship_names = ship_names
+        self.other_ship_names = other_ship_names
+
+    def __str__(self):
+        return "Cannot merge statistics for fleet {0} into fleet {1}.".format(
+            self.other_ship_names, self.ship_names)
+
+
+class GameStats:
+
+    """Running statistics over the shots of one attacker across many games.
+
+    Each shot is fed to record() with the Outcome it produced. Only fixed-size
+    histograms and counters are kept, so memory use does not grow with the
+    number of games:
+
+    - shots_to_win: games won, indexed by number of shots taken
+    - first_hits: per grid space count of a game's first hit
+    - sink_turns: per ship, games in which it was sunk, indexed by shot number
+    - shots_by_turn and hits_by_turn: shots taken and hits scored, indexed by
+      shot number, giving the hit-rate curve
+
+    Accumulators filled in separate worker processes are combined with
+    merge(); they pickle as a handful of NumPy arrays.
+    """
+
+    def __init__(self, ships=fleet, max_shots=len(COORDS)):
+        """Allocates a new instance.
+
+        :param ships: the fleet being attacked; sink_turns rows follow its order
+        :param max_shots: most shots a game can take, one per grid space by default
+        :return: new instance
+        """
+        self.ship_names = [ship.name for ship in ships]
+        self.max_shots = max_shots
+        self._ship_index = {name: index for index, name in enumerate(self.ship_names)}
+
+        self.games = 0
+        self.shots_to_win = np.zeros(max_shots + 1, dtype=np.int64)
+        self.first_hits = np.zeros(len(COORDS), dtype=np.int64)
+        self.sink_turns = np.zeros((len(self.ship_names), max_shots + 1), dtype=np.int64)
+        self.shots_by_turn = np.zeros(max_shots + 1, dtype=np.int64)
+        self.hits_by_turn = np.zeros(max_shots + 1, dtype=np.int64)
+
+        self._shot = 0
+        self._hit_seen = False
+
+    def record(self, coord, outcome):
+        """Accumulates one shot of the game in progress.
+
+        A winning outcome completes the game.
+
+        :param coord: the player co-ordinate that was attacked
+        :param outcome: the Outcome of the attack
+        """
+        self._shot = shot = min(self._shot + 1, self.max_shots)
+        self.shots_by_turn[shot] += 1
+
+        state = outcome.outcome_state
+        if state == OutcomeState.MISS:
+            return
+
+        self.hits_by_turn[shot] += 1
+
+        if not self._hit_seen:
+            self._hit_seen = True
+            self.first_hits[COORD_INDEX[coord]] += 1
+
+        if state != OutcomeState.HIT:
+            self.sink_turns[self._ship_index[outcome.ship_name], shot] += 1
+
+        if state == OutcomeState.WIN:
+            self.shots_to_win[shot] += 1
+            self.end_game()
+
+    def end_game(self):
+        """Completes the game in progress, e.g. when it is abandoned."""
+        if self._shot:
+            self.games += 1
+        self._shot = 0
+        self._hit_seen = False
+
+    def merge(self, other):
+        """Adds the totals of another accumulator to this one.
+
+        :param other: GameStats for the same fleet and max_shots
+        :return: this instance
+        """
+        if self.ship_names != other.ship_names or self.max_shots != other.max_shots:
+            raise IncompatibleStats(self.ship_names, other.ship_names)
+
+        self.games += other.games
+        self.shots_to_win += other.shots_to_win
+        self.first_hits += other.first_hits
+        self.sink_turns += other.sink_turns
+        self.shots_by_turn += other.shots_by_turn
+        self.hits_by_turn += other.hits_by_turn
+
+        return self
+
+    def hit_rate_by_turn(self):
+        """Calculates the fraction of shots that hit, per shot number.
+
+        :return: float array indexed by shot number; NaN where no shots taken
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.hits_by_turn / self.shots_by_turn
+
+    def first_hit_heatmap(self, dimension=(8, 8)):
+        """Returns the first hit counts laid out as the battle grid.
+
+        :param dimension: rows and columns of the battle grid
+        :return: 2D int array indexed by row and column
+        """
+        return self.first_hits.reshape(dimension)
+
+    def mean_shots_to_win(self):
+        """Calculates the mean number of shots taken to win.
+
+        :return: the mean, or NaN when no game has been won
+        """
+        won = self.shots_to_win.sum()
+        if not won:
+            return float('nan')
+        return float(np.dot(np.arange(self.max_shots + 1), self.shots_to_win) / won)
+
+    @staticmethod
+    def from_arrays(arrays, ships=fleet):
+        """Rebuilds an accumulator from the output of to_arrays().
+
+        :param arrays: mapping of statistic name to NumPy array
+        :param ships: the fleet the statistics were gathered against
+        :return: new GameStats instance
+        """
+        accumulator = GameStats(ships, len(arrays['shots_to_win']) - 1)
+
+        accumulator.games = int(arrays['games'])
+        accumulator.shots_to_win += arrays['shots_to_win']
+        accumulator.first_hits += np.asarray(arrays['first_hits']).reshape(-1)
+        accumulator.sink_turns += arrays['sink_turns']
+        accumulator.shots_by_turn += arrays['shots_by_turn']
+        accumulator.hits_by_turn += arrays['hits_by_turn']
+
+        return accumulator
+
+    def to_arrays(self):
+        """Exports the accumulated statistics.
+
+        :return: dict of NumPy arrays, keyed by statistic name
+        """
+        return {
+            'games': np.array(self.games, dtype=np.int64),
+            'shots_to_win': self.shots_to_win.copy(),
+            'first_hits': self.first_hit_heatmap().copy(),
+            'sink_turns': self.sink_turns.copy(),
+            'shots_by_turn': self.shots_by_turn.copy(),
+            'hits_by_turn': self.hits_by_turn.copy(),
+            'hit_rate_by_turn': self.hit_rate_by_turn(),
+        }
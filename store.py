@@ -0,0 +1,544 @@
+#!/usr/bin/env python
+
+import fcntl
+import os
+import sys
+import tempfile
+import threading
+
+from copy import deepcopy
+from multiprocessing import parent_process, resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+from engine import (COORD_INDEX, COORDS, STANDARD_RULES, AlreadyAttacked,
+                    BattleGrid, GridSpace, InvalidCoord, Outcome, Ruleset,
+                    fleet, grid_masks)
+
+
+ATTACKED = 0x80
+SHIP_MASK = 0x7f
+
+
+class NoFreeSlot(Exception):
+
+    """Raised when every slot in a shared board store is in use."""
+
+    def __init__(self, slot_count):
+        """Allocates a new instance.
+
+        :param slot_count: the number of slots in the exhausted store
+        :return: new instance
+        """
+        self.slot_count = slot_count
+
+    def __str__(self):
+        return "All {0} board slots are in use.".format(self.slot_count)
+
+
+class IncompatibleRuleset(Exception):
+
+    """Raised when saving a game whose rules differ from the store's."""
+
+    def __init__(self, ruleset):
+        """Allocates a new instance.
+
+        :param ruleset: the Ruleset of the rejected game
+        :return: new instance
+        """
+        self.ruleset = ruleset
+
+    def __str__(self):
+        return ("Game rules (no_touch={0}, reveal_adjacent_on_sunk={1}) differ "
+                "from the store's.").format(self.ruleset.no_touch,
+                                            self.ruleset.reveal_adjacent_on_sunk)
+
+
+class _SlotLock:
+
+    """Lock on one byte of a store's lock file.
+
+    fcntl byte-range locks exclude other processes but are held per
+    process, so a thread lock also excludes other threads of this process.
+    """
+
+    def __init__(self, fd, offset):
+        """Allocates a new instance.
+
+        :param fd: descriptor of the lock file
+        :param offset: byte of the lock file guarded by this lock
+        :return: new instance
+        """
+        self._fd = fd
+        self._offset = offset
+        self._thread_lock = threading.Lock()
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, self._offset)
+        except BaseException:
+            self._thread_lock.release()
+            raise
+
+    def release(self):
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, self._offset)
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class _LockFile:
+
+    """The slot locks of one store, shared by every store attached in a process.
+
+    Closing any descriptor of a file drops all of the process's byte-range
+    locks on it, so a process opens each lock file once and counts the
+    stores using it.
+    """
+
+    def __init__(self, path, lock_count, create):
+        flags = os.O_RDWR | (os.O_CREAT | os.O_EXCL if create else 0)
+        self.path = path
+        self.fd = os.open(path, flags, 0o600)
+        self.locks = [_SlotLock(self.fd, offset) for offset in range(lock_count)]
+        self.users = 0
+
+
+_lock_files = {}
+_lock_files_guard = threading.Lock()
+
+
+def _open_lock_file(name, lock_count, create):
+    """Returns this process's _LockFile for a block, opening it once."""
+    with _lock_files_guard:
+        lock_file = _lock_files.get(name)
+        if lock_file is None:
+            path = os.path.join(tempfile.gettempdir(), '{0}.lock'.format(name))
+            lock_file = _lock_files[name] = _LockFile(path, lock_count, create)
+        lock_file.users += 1
+        return lock_file
+
+
+def _close_lock_file(name):
+    with _lock_files_guard:
+        lock_file = _lock_files[name]
+        lock_file.users -= 1
+        if not lock_file.users:
+            del _lock_files[name]
+            os.close(lock_file.fd)
+
+
+def _reset_after_fork():
+    """A forked child holds none of its parent's locks, so starts them afresh."""
+    global _lock_files_guard
+    _lock_files_guard = threading.Lock()
+    for lock_file in _lock_files.values():
+        for lock in lock_file.locks:
+            lock._thread_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+# names of the blocks created by this process
+_created_blocks = set()
+
+
+def _attach_block(name):
+    """Attaches to an existing block without letting this process destroy it.
+
+    Before Python 3.13, attaching registers the block with the process's
+    resource tracker, which unlinks it when the process exits. The block is
+    unregistered again unless this process created it, or shares the
+    tracker of the multiprocessing parent that may have created it.
+    """
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, track=False)
+
+    shm = SharedMemory(name=name)
+    if parent_process() is None and shm.name not in _created_blocks:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+class SharedBoardStore:
+
+    """Stores the board state of many games in a shared memory block.
+
+    Each game occupies one fixed-size slot. A slot holds, for both players,
+    one byte per grid cell (ship index in the low bits, attacked flag in the
+    high bit), one hit count and one placement number per ship in the fleet
+    and the active ship count, followed by the index of the current player.
+    Any process attached to the store can resolve a turn for any slot
+    without the Game being pickled or routed to a specific process.
+
+    Player 0 is the Game's human and player 1 its computer. Every process
+    must construct or attach the store with the same fleet and ruleset, as
+    ship indexes and placement numbers are resolved against them. Turns
+    follow the ruleset, revealing the spaces around sunk ships when it says
+    so; save() rejects games played under other rules.
+
+    Slots are locked with byte-range locks on a file named after the block
+    in the temporary directory, so any process attached by name shares the
+    locks. The store pickles by name, so it can be passed to a
+    multiprocessing.Process or Pool worker, which re-attaches to the block.
+    """
+
+    def __init__(self, slot_count, ships=fleet, name=None, ruleset=None):
+        """Allocates a new store or attaches to an existing one.
+
+        :param slot_count: number of game slots in the store
+        :param ships: fleet used by every game in the store
+        :param name: name of an existing block to attach to; None creates one
+        :param ruleset: optional Ruleset of every game in the store; standard
+                        rules when None
+        :return: new instance
+        """
+        self.slot_count = slot_count
+        self.ships = [deepcopy(ship) for ship in ships]
+        self.ruleset = ruleset if ruleset is not None else STANDARD_RULES
+        self.masks = grid_masks((8, 8))
+        self.cell_count = len(COORDS)
+
+        self._hits_offset = self.cell_count
+        self._placements_offset = self._hits_offset + len(self.ships)
+        self._active_offset = self._placements_offset + len(self.ships)
+        self._player_size = self._active_offset + 1
+        self._in_use_offset = 2 * self._player_size
+        self._current_offset = self._in_use_offset + 1
+        self.slot_size = self._current_offset + 1
+
+        self._owner = name is None
+        if self._owner:
+            self._shm = SharedMemory(
+                create=True, size=slot_count * self.slot_size)
+            self._shm.buf[:slot_count * self.slot_size] = bytes(
+                slot_count * self.slot_size)
+            _created_blocks.add(self._shm.name)
+        else:
+            self._shm = _attach_block(name)
+
+        self.name = self._shm.name
+        self._buf = self._shm.buf
+
+        # one lock per slot followed by the allocation lock
+        self._lock_file = _open_lock_file(self.name, slot_count + 1, self._owner)
+        self._locks = self._lock_file.locks
+
+    def __getstate__(self):
+        return {'slot_count': self.slot_count, 'ships': self.ships,
+                'name': self.name, 'ruleset': self.ruleset}
+
+    def __setstate__(self, state):
+        self.__init__(state['slot_count'], state['ships'], state['name'],
+                      state['ruleset'])
+
+    def lock(self, slot):
+        """Returns the lock guarding a slot.
+
+        :param slot: slot index
+        :return: lock for the slot, usable as a context manager
+        """
+        self._check_slot(slot)
+        return self._locks[slot]
+
+    def allocate(self):
+        """Reserves a free slot and clears it.
+
+        :return: index of the reserved slot
+        """
+        with self._locks[self.slot_count]:
+            for slot in range(self.slot_count):
+                base = slot * self.slot_size
+                if not self._buf[base + self._in_use_offset]:
+                    self._buf[base:base + self.slot_size] = bytes(
+                        self.slot_size)
+                    self._buf[base + self._in_use_offset] = 1
+                    return slot
+
+        raise NoFreeSlot(self.slot_count)
+
+    def free(self, slot):
+        """Releases a slot so it can be allocated again.
+
+        :param slot: slot index
+        """
+        self._check_slot(slot)
+        with self._locks[slot], self._locks[self.slot_count]:
+            self._buf[slot * self.slot_size + self._in_use_offset] = 0
+
+    def in_use(self, slot):
+        """Tests whether a slot has been allocated.
+
+        :param slot: slot index
+        :return: True when allocated; False otherwise
+        """
+        self._check_slot(slot)
+        return self._buf[slot * self.slot_size + self._in_use_offset] == 1
+
+    def save(self, slot, game):
+        """Copies the board state of a game into a slot.
+
+        :param slot: slot index
+        :param game: the Game to copy
+        """
+        self._check_slot(slot)
+        base = slot * self.slot_size
+
+        for player in (game.human, game.computer):
+            ruleset = player.battle_grid.ruleset
+            if (ruleset.no_touch != self.ruleset.no_touch or
+                    ruleset.reveal_adjacent_on_sunk != self.ruleset.reveal_adjacent_on_sunk):
+                raise IncompatibleRuleset(ruleset)
+
+        with self._locks[slot]:
+            for index, player in enumerate((game.human, game.computer)):
+                self._save_grid(base + index * self._player_size,
+                                player.battle_grid)
+
+            self._buf[base + self._current_offset] = (
+                0 if game.current_player is game.human else 1)
+
+    def load(self, slot, game):
+        """Restores the board state held in a slot onto a game's players.
+
+        The players' battle grids are replaced with grids rebuilt from the
+        slot under the store's ruleset, using fresh copies of its fleet.
+
+        :param slot: slot index
+        :param game: the Game to restore into
+        """
+        self._check_slot(slot)
+        base = slot * self.slot_size
+
+        with self._locks[slot]:
+            players = (game.human, game.computer)
+            for index, player in enumerate(players):
+                player.battle_grid = self._load_grid(
+                    base + index * self._player_size, player)
+
+            current = self._buf[base + self._current_offset]
+            game.current_player = players[current]
+            game.current_opponent = players[1 - current]
+
+    def current_player(self, slot):
+        """Returns which player is taking the turn in a slot.
+
+        :param slot: slot index
+        :return: 0 for the game's human player, 1 for its computer player
+        """
+        self._check_slot(slot)
+        return self._buf[slot * self.slot_size + self._current_offset]
+
+    def next_player(self, slot):
+        """Swaps the current player and opponent in a slot.
+
+        :param slot: slot index
+        :return: index of the new current player
+        """
+        self._check_slot(slot)
+        offset = slot * self.slot_size + self._current_offset
+
+        with self._locks[slot]:
+            self._buf[offset] ^= 1
+            return self._buf[offset]
+
+    def take_turn(self, slot, coord):
+        """Current player of a slot attacks the grid space at coord.
+
+        Mirrors Game.take_turn, resolving the attack directly on the shared
+        block while holding the slot lock. Under rules that reveal the spaces
+        around sunk ships, the outcome lists them in revealed.
+
+        :param slot: slot index
+        :param coord: the player co-ordinate of the grid space being attacked
+        :return: an Outcome - miss(), hit(ship), sunk(ship) or win(ship)
+        """
+        self._check_slot(slot)
+
+        if coord not in COORD_INDEX:
+            raise InvalidCoord(coord)
+
+        base = slot * self.slot_size
+        buf = self._buf
+
+        with self._locks[slot]:
+            opponent = 1 - buf[base + self._current_offset]
+            player_base = base + opponent * self._player_size
+            cell_offset = player_base + COORD_INDEX[coord]
+            cell = buf[cell_offset]
+
+            if cell & ATTACKED:
+                raise AlreadyAttacked(coord)
+
+            buf[cell_offset] = cell | ATTACKED
+
+            ship_index = cell & SHIP_MASK
+            if not ship_index:
+                return Outcome.miss()
+
+            ship = self.ships[ship_index - 1]
+            hits_offset = player_base + self._hits_offset + ship_index - 1
+            buf[hits_offset] += 1
+
+            if buf[hits_offset] < ship.size:
+                return Outcome.hit(ship)
+
+            buf[player_base + self._active_offset] -= 1
+
+            if buf[player_base + self._active_offset] == 0:
+                outcome = Outcome.win(ship)
+            else:
+                outcome = Outcome.sunk(ship)
+
+            if self.ruleset.reveal_adjacent_on_sunk:
+                outcome.revealed = self._reveal_around(player_base, ship_index - 1)
+
+            return outcome
+
+    def close(self):
+        """Detaches this process from the shared block."""
+        self._buf = None
+        self._shm.close()
+        _close_lock_file(self.name)
+
+    def unlink(self):
+        """Destroys the shared block; only the creating process should call this."""
+        self._shm.unlink()
+        _created_blocks.discard(self.name)
+        try:
+            os.remove(self._lock_file.path)
+        except FileNotFoundError:
+            pass
+
+    def _check_slot(self, slot):
+        if not 0 <= slot < self.slot_count:
+            raise IndexError(
+                'Slot {0} is out of range for {1} slots.'.format(
+                    slot, self.slot_count))
+
+    def _placement(self, offset, ship_index):
+        """Decodes the Placement of a ship in the player section at offset.
+
+        :return: the Placement, or None when the ship was not placed
+        """
+        number = self._buf[offset + self._placements_offset + ship_index]
+        if not number:
+            return None
+        return self.masks.placements(self.ships[ship_index].size)[number - 1]
+
+    def _reveal_around(self, offset, ship_index):
+        """Marks the un-attacked empty spaces around a ship as attacked.
+
+        :return: list of revealed player co-ordinates
+        """
+        placement = self._placement(offset, ship_index)
+        if placement is None:
+            return []
+
+        revealed = []
+        for coord in self.masks.coords_of(placement.halo):
+            cell_offset = offset + COORD_INDEX[coord]
+            if not self._buf[cell_offset]:
+                self._buf[cell_offset] = ATTACKED
+                revealed.append(coord)
+
+        return revealed
+
+    def _save_grid(self, offset, battle_grid):
+        """Encodes a battle grid into the player section starting at offset."""
+        cells = bytearray(self._player_size)
+
+        for ship, placement in battle_grid.placements:
+            ship_index = self.ships.index(ship)
+            cells[self._placements_offset + ship_index] = placement.number + 1
+
+        for coord, grid_space in battle_grid.grid.items():
+            if coord not in COORD_INDEX:
+                continue
+
+            cell = 0
+            if grid_space.ship:
+                ship_index = self.ships.index(grid_space.ship)
+                cell = ship_index + 1
+                cells[self._hits_offset + ship_index] = grid_space.ship.hits
+            if grid_space.state:
+                cell |= ATTACKED
+
+            cells[COORD_INDEX[coord]] = cell
+
+        cells[self._active_offset] = battle_grid.active_ship_count
+        self._buf[offset:offset + self._player_size] = cells
+
+    def _load_grid(self, offset, player):
+        """Decodes the player section starting at offset into a new BattleGrid."""
+        battle_grid = BattleGrid(Ruleset(self.ships, self.ruleset.no_touch,
+                                         self.ruleset.reveal_adjacent_on_sunk))
+        ships = [deepcopy(ship) for ship in self.ships]
+
+        for index, ship in enumerate(ships):
+            ship.hits = self._buf[offset + self._hits_offset + index]
+
+            placement = self._placement(offset, index)
+            if placement is not None:
+                battle_grid.occupied |= placement.mask
+                battle_grid.excluded |= battle_grid.ruleset.exclusion(placement)
+                battle_grid.placements.append((ship, placement))
+
+        for index, coord in enumerate(COORDS):
+            cell = self._buf[offset + index]
+            ship_index = cell & SHIP_MASK
+
+            if cell & ATTACKED:
+                battle_grid.attacked |= 1 << index
+
+            if ship_index:
+                state = 'hit' if cell & ATTACKED else ''
+                battle_grid.grid[coord] = GridSpace(
+                    battle_grid, coord, ships[ship_index - 1], state)
+            elif cell & ATTACKED:
+                battle_grid.grid[coord] = GridSpace(
+                    player, coord, state='miss')
+
+        battle_grid.active_ship_count = self._buf[offset + self._active_offset]
+
+        return battle_grid
+
+
+class SharedGame:
+
+    """A Game whose board state lives in a SharedBoardStore slot.
+
+    Offers the take_turn() and next_player() methods of Game so a worker can
+    drive any session it is handed by slot index.
+    """
+
+    def __init__(self, store, slot):
+        """Allocates a new instance.
+
+        :param store: the SharedBoardStore holding the game
+        :param slot: the slot index of the game
+        :return: new instance
+        """
+        self.store = store
+        self.slot = slot
+
+    def next_player(self):
+        """Swaps current player and opponent.
+
+        :return: index of the new current player
+        """
+        return self.store.next_player(self.slot)
+
+    def take_turn(self, coord):
+        """Current player attacks a grid space identified by a player co-ordinate.
+
+        :param coord: the player co-ordinate of the grid space being attacked
+        :return: an Outcome representing the result of the attack
+        """
+        return self.store.take_turn(self.slot, coord)
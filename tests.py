@@ -1,8 +1,28 @@
 #!/usr/bin/env python3
 
+import asyncio
+import copy
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
 
+import numpy
+
 import engine
+import environment
+import events
+import prior
+import scheduler
+import sessions
+import simulate
+import stats
+import store
 
 
 class GameTest(unittest.TestCase):
@@ -64,6 +84,45 @@ class GameTest(unittest.TestCase):
 
         self.assertEquals(cm.exception.coord, targetCoord)
 
+    def test_play_turn_passes_turn(self):
+        self.assertEqual(
+            engine.Outcome.miss(), self.game.play_turn(self.p1, 'B3'))
+        self.assertEqual(self.game.current_player, self.p2)
+
+    def test_play_turn_out_of_turn_raises_exception(self):
+        with self.assertRaises(engine.NotPlayersTurn) as cm:
+            self.game.play_turn(self.p2, 'B3')
+
+        self.assertEqual(cm.exception.player, self.p2)
+
+    def test_racing_turns_resolve_each_space_once(self):
+        results = []
+        barrier = threading.Barrier(8)
+
+        def attack():
+            barrier.wait()
+            for coord in engine.COORDS:
+                try:
+                    results.append(self.game.take_turn(coord))
+                except engine.AlreadyAttacked:
+                    pass
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            workers = [threading.Thread(target=attack) for _ in range(8)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        finally:
+            sys.setswitchinterval(interval)
+
+        self.assertEqual(len(results), len(engine.COORDS))
+        self.assertEqual(self.p2_grid.active_ship_count, 0)
+        self.assertEqual(
+            sum(result.is_game_over() for result in results), 1)
+
     def test_next_player(self):
         prior_player = self.game.current_player
         prior_opponent = self.game.current_opponent
@@ -166,6 +225,88 @@ class BattleGridTest(unittest.TestCase):
     def test_place_portrait_ship_on_board(self):
         self.grid.place_ship(engine.Ship.carrier(), 'C5', engine.Orientation.PORTRAIT)
 
+class RulesetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.masks = engine.grid_masks((8, 8))
+        self.no_touch = engine.Ruleset(no_touch=True)
+
+    def test_masks_shared_per_dimension(self):
+        self.assertIs(engine.BattleGrid().masks, self.masks)
+
+    def test_neighbors_of_corner(self):
+        self.assertEqual(self.masks.coords_of(self.masks.neighbors[0]),
+                         ['A2', 'B1', 'B2'])
+
+    def test_placement_count(self):
+        self.assertEqual(len(self.masks.placements(5)), 64)
+
+    def test_off_grid_placement(self):
+        self.assertIsNone(
+            self.masks.placement('A5', engine.Orientation.LANDSCAPE, 5))
+
+    def test_touching_ships_allowed_by_standard_rules(self):
+        grid = engine.BattleGrid()
+        grid.place_ship(engine.Ship.destroyer(), 'A1', engine.Orientation.LANDSCAPE)
+        grid.place_ship(engine.Ship.submarine(), 'B3', engine.Orientation.LANDSCAPE)
+
+        self.assertEqual(grid.active_ship_count, 2)
+
+    def test_no_touch_raises_exception(self):
+        grid = engine.BattleGrid(self.no_touch)
+        grid.place_ship(engine.Ship.destroyer(), 'A1', engine.Orientation.LANDSCAPE)
+
+        with self.assertRaises(engine.ShipsTouching) as cm:
+            grid.place_ship(engine.Ship.submarine(), 'B3', engine.Orientation.LANDSCAPE)
+
+        self.assertEqual(cm.exception.coord, 'B3')
+
+    def test_no_touch_random_layout(self):
+        grid = engine.BattleGrid(self.no_touch)
+        grid.random_layout(copy.deepcopy(engine.fleet))
+
+        self.assertEqual(grid.active_ship_count, 5)
+        for coord, grid_space in grid.grid.items():
+            index = engine.COORD_INDEX[coord]
+            for neighbor in self.masks.coords_of(self.masks.neighbors[index]):
+                if neighbor in grid.grid:
+                    self.assertIs(grid.grid[neighbor].ship, grid_space.ship)
+
+    def test_reveal_adjacent_on_sunk(self):
+        player = engine.Player(
+            'Player Two', engine.Ruleset(reveal_adjacent_on_sunk=True))
+        player.battle_grid.place_ship(
+            engine.Ship.destroyer(), 'A1', engine.Orientation.LANDSCAPE)
+        player.battle_grid.place_ship(
+            engine.Ship.submarine(), 'H1', engine.Orientation.LANDSCAPE)
+        attacker = engine.RandomAIPlayer('Computer')
+
+        player.receive_attack('A1')
+        outcome = player.receive_attack('A2')
+        attacker.record_outcome('A2', outcome)
+
+        self.assertEqual(outcome.revealed, ['A3', 'B1', 'B2', 'B3'])
+        self.assertTrue(player.battle_grid.grid['B2'].is_miss())
+        self.assertIn('B3', attacker.attacked)
+        with self.assertRaises(engine.AlreadyAttacked):
+            player.receive_attack('B1')
+
+    def test_reveal_skips_attacked_and_occupied_spaces(self):
+        player = engine.Player(
+            'Player Two', engine.Ruleset(reveal_adjacent_on_sunk=True))
+        player.battle_grid.place_ship(
+            engine.Ship.destroyer(), 'A1', engine.Orientation.LANDSCAPE)
+        player.battle_grid.place_ship(
+            engine.Ship.submarine(), 'B3', engine.Orientation.LANDSCAPE)
+
+        player.receive_attack('B1')
+        player.receive_attack('A1')
+        outcome = player.receive_attack('A2')
+
+        self.assertEqual(outcome.revealed, ['A3', 'B2'])
+        self.assertFalse(player.battle_grid.grid['B3'].is_miss())
+
+
 class PlayerTest(unittest.TestCase):
 
     def setUp(self):
@@ -185,6 +326,812 @@ class RandomAIPlayerTest(unittest.TestCase):
         self.assertEquals(expected_next, actual_next)
         self.assertEqual(len(player.targets),63)
 
+    def test_no_touch_skips_around_sunk_ship(self):
+        player = engine.RandomAIPlayer('Computer', engine.Ruleset(no_touch=True))
+        player.record_outcome('C3', engine.Outcome.hit(engine.Ship.destroyer()))
+        player.record_outcome('C4', engine.Outcome.sunk(engine.Ship.destroyer()))
+
+        targets = [player.next_target() for _ in range(52)]
+
+        self.assertTrue(set(targets).isdisjoint(
+            {'B2', 'B3', 'B4', 'B5', 'C2', 'C5', 'D2', 'D3', 'D4', 'D5'}))
+        self.assertEqual(len(player.hits), 0)
+
+
+class HuntTargetAIPlayerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.player = engine.HuntTargetAIPlayer('Computer')
+
+    def parity(self, coord):
+        (row, column) = divmod(engine.COORD_INDEX[coord], 8)
+        return (row + column) % 2
+
+    def test_hunts_on_parity(self):
+        targets = []
+        for _ in range(10):
+            target = self.player.next_target()
+            self.player.record_outcome(target, engine.Outcome.miss())
+            targets.append(target)
+
+        self.assertEqual(len({self.parity(target) for target in targets}), 1)
+
+    def test_targets_neighbors_after_hit(self):
+        self.player.record_outcome('C3', engine.Outcome.hit(engine.Ship.destroyer()))
+
+        neighbors = {self.player.next_target() for _ in range(4)}
+
+        self.assertEqual(neighbors, {'B3', 'D3', 'C2', 'C4'})
+
+    def test_extends_line_of_hits(self):
+        self.player.record_outcome('C3', engine.Outcome.hit(engine.Ship.carrier()))
+        self.player.record_outcome('C4', engine.Outcome.hit(engine.Ship.carrier()))
+
+        self.assertEqual(self.player.next_target(), 'C5')
+
+    def test_returns_to_hunting_after_sunk(self):
+        self.player.record_outcome('C3', engine.Outcome.hit(engine.Ship.destroyer()))
+        self.player.record_outcome('C4', engine.Outcome.sunk(engine.Ship.destroyer()))
+
+        self.assertEqual(len(self.player.hits), 0)
+        self.assertEqual(len(self.player.frontier), 0)
+        self.assertEqual(self.player.remaining, [3, 3, 4, 5])
+
+    def test_wins_game_without_repeating_targets(self):
+        defender = engine.Player('Player Two')
+        defender.random_layout()
+
+        for shots in range(1, 65):
+            target = self.player.next_target()
+            outcome = defender.receive_attack(target)
+            self.player.record_outcome(target, outcome)
+            if outcome.is_game_over():
+                break
+
+        self.assertTrue(outcome.is_game_over())
+
+
+class GameEventsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.p1 = engine.Player('Player One')
+        self.p2 = engine.Player('Player Two')
+        self.p2_destroyer = engine.Ship.destroyer()
+        self.p2.battle_grid.place_ship(
+            self.p2_destroyer, 'C7', engine.Orientation.PORTRAIT)
+
+        self.game = engine.Game(self.p1, self.p2)
+
+    def test_turn_events(self):
+        subscription = self.game.subscribe()
+
+        self.game.take_turn('C7')
+        self.game.next_player()
+
+        self.assertEqual(
+            [event.event_type for event in subscription.drain()],
+            [events.EventType.TURN_TAKEN, events.EventType.OUTCOME,
+             events.EventType.PLAYER_SWITCHED])
+
+    def test_win_events(self):
+        subscription = self.game.subscribe(event_types=[
+            events.EventType.SHIP_SUNK, events.EventType.GAME_WON])
+
+        self.game.take_turn('C7')
+        self.game.take_turn('D7')
+
+        expected_outcome = engine.Outcome.win(self.p2_destroyer)
+        self.assertEqual(subscription.drain(), [
+            events.Event(events.EventType.SHIP_SUNK, self.p1, self.p2,
+                         'D7', expected_outcome),
+            events.Event(events.EventType.GAME_WON, self.p1, self.p2,
+                         'D7', expected_outcome)])
+
+    def test_drop_policy_keeps_newest(self):
+        subscription = self.game.subscribe(maxsize=2)
+
+        self.game.take_turn('A1')
+        self.game.take_turn('A2')
+
+        self.assertEqual(subscription.dropped, 2)
+        self.assertEqual([event.coord for event in subscription.drain()],
+                         ['A2', 'A2'])
+
+    def test_callback_receives_events(self):
+        received = []
+        done = threading.Event()
+
+        def observe(event):
+            received.append(event.event_type)
+            if event.event_type == events.EventType.PLAYER_SWITCHED:
+                done.set()
+
+        self.game.subscribe(observe, maxsize=1,
+                            policy=events.DeliveryPolicy.BLOCK)
+        self.game.take_turn('A1')
+        self.game.next_player()
+
+        self.assertTrue(done.wait(5))
+        self.assertEqual(received, [events.EventType.TURN_TAKEN,
+                                    events.EventType.OUTCOME,
+                                    events.EventType.PLAYER_SWITCHED])
+
+    def test_unsubscribe_stops_delivery(self):
+        subscription = self.game.subscribe()
+        self.game.unsubscribe(subscription)
+
+        self.game.take_turn('A1')
+
+        self.assertEqual(len(subscription), 0)
+
+
+class GameStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ships = [engine.Ship.submarine(), engine.Ship.destroyer()]
+        self.stats = stats.GameStats(self.ships)
+
+    def play(self, accumulator, coords):
+        player = engine.Player('Player Two')
+        player.battle_grid.place_ship(
+            engine.Ship.submarine(), 'A1', engine.Orientation.LANDSCAPE)
+        player.battle_grid.place_ship(
+            engine.Ship.destroyer(), 'C7', engine.Orientation.PORTRAIT)
+        game = engine.Game(engine.Player('Player One'), player)
+
+        for coord in coords:
+            accumulator.record(coord, game.take_turn(coord))
+
+    def test_records_won_game(self):
+        self.play(self.stats, ['B1', 'C7', 'D7', 'A1', 'A2', 'A3'])
+
+        self.assertEqual(self.stats.games, 1)
+        self.assertEqual(self.stats.shots_to_win[6], 1)
+        self.assertEqual(self.stats.first_hit_heatmap()[2, 6], 1)
+        self.assertEqual(self.stats.sink_turns[1, 3], 1)
+        self.assertEqual(self.stats.sink_turns[0, 6], 1)
+        self.assertEqual(self.stats.hit_rate_by_turn()[1], 0.0)
+        self.assertEqual(self.stats.hit_rate_by_turn()[2], 1.0)
+        self.assertEqual(self.stats.mean_shots_to_win(), 6.0)
+
+    def test_merge(self):
+        other = stats.GameStats(self.ships)
+        self.play(self.stats, ['C7', 'D7', 'A1', 'A2', 'A3'])
+        self.play(other, ['B1', 'C7', 'D7', 'A1', 'A2', 'A3'])
+
+        self.stats.merge(other)
+
+        arrays = self.stats.to_arrays()
+        self.assertEqual(arrays['games'], 2)
+        self.assertEqual(arrays['first_hits'][2, 6], 2)
+        self.assertEqual(self.stats.mean_shots_to_win(), 5.5)
+        self.assertAlmostEqual(arrays['hit_rate_by_turn'][1], 0.5)
+
+    def test_merge_different_fleet_raises_exception(self):
+        with self.assertRaises(stats.IncompatibleStats):
+            self.stats.merge(stats.GameStats())
+
+
+class VectorEnvTest(unittest.TestCase):
+
+    def setUp(self):
+        self.env = environment.VectorEnv(2, ships=[engine.Ship.destroyer()])
+
+    def ship_cells(self, index):
+        grid = self.env.games[index].current_opponent.battle_grid.grid
+        return sorted(engine.COORD_INDEX[coord] for coord in grid)
+
+    def test_reset_observations(self):
+        observations = self.env.reset()
+
+        self.assertEqual(observations.shape, (2, 4, 8, 8))
+        self.assertTrue(observations[:, environment.UNKNOWN].all())
+        self.assertFalse(observations[:, environment.MISS:].any())
+
+    def test_step_updates_buffers_in_place(self):
+        first, second = self.ship_cells(0)
+        miss = next(i for i in range(64) if i not in self.ship_cells(1))
+
+        observations, rewards, dones, infos = self.env.step([first, miss])
+
+        self.assertIs(observations, self.env.observations)
+        cells = observations.reshape(2, 4, 64)
+        self.assertEqual(cells[0, environment.HIT, first], 1)
+        self.assertEqual(cells[1, environment.MISS, miss], 1)
+        self.assertEqual(list(rewards), [1.0, 0.0])
+
+        self.env.step([first, miss])
+        self.assertEqual(rewards[0], -1.0)
+
+    def test_step_rejects_out_of_range_action(self):
+        for action in (-1, 64):
+            with self.assertRaises(engine.InvalidCoord) as cm:
+                self.env.step([0, action])
+            self.assertEqual(cm.exception.coord, action)
+
+        self.assertTrue(self.env.observations[:, environment.UNKNOWN].all())
+
+    def test_step_rejects_wrong_batch_size(self):
+        for actions in ([0], [0, 1, 2]):
+            with self.assertRaises(ValueError):
+                self.env.step(actions)
+
+        self.assertTrue(self.env.observations[:, environment.UNKNOWN].all())
+
+    def test_win_resets_game(self):
+        first, second = self.ship_cells(0)
+        other = self.ship_cells(1)
+        self.env.step([first, other[0]])
+        finished = self.env.games[0]
+
+        observations, rewards, dones, infos = self.env.step([second, other[1]])
+
+        self.assertTrue(dones.all())
+        self.assertEqual(list(infos['episode_shots']), [2, 2])
+        self.assertIsNot(self.env.games[0], finished)
+        self.assertTrue(observations[:, environment.UNKNOWN].all())
+
+    def test_target_observation_marks_sunk_ship(self):
+        player = engine.Player('Player Two')
+        player.battle_grid.place_ship(
+            engine.Ship.destroyer(), 'C7', engine.Orientation.PORTRAIT)
+        player.battle_grid.place_ship(
+            engine.Ship.submarine(), 'A1', engine.Orientation.LANDSCAPE)
+        for coord in ['C7', 'D7', 'A1', 'H8']:
+            player.receive_attack(coord)
+
+        observation = environment.target_observation(player)
+
+        self.assertEqual(observation[environment.SUNK].sum(), 2)
+        self.assertEqual(observation[environment.SUNK, 2, 6], 1)
+        self.assertEqual(observation[environment.HIT].sum(), 3)
+        self.assertEqual(observation[environment.MISS, 7, 7], 1)
+        self.assertEqual(observation[environment.UNKNOWN].sum(), 60)
+
+
+class SlowAIPlayer(engine.AIPlayer):
+
+    def __init__(self, name, offers):
+        super().__init__(name)
+        self.offers = offers
+        self.stopped = threading.Event()
+
+    def next_target(self):
+        return 'H8'
+
+    def search_target(self, search):
+        for coord in self.offers:
+            search.offer(coord)
+        while not search.cancelled:
+            time.sleep(0.001)
+        self.stopped.set()
+
+    def fallback_target(self):
+        return 'A1'
+
+
+class SlowHuntTargetAIPlayer(engine.HuntTargetAIPlayer):
+
+    def __init__(self, name, delay):
+        super().__init__(name)
+        self.delay = delay
+
+    def next_target(self):
+        time.sleep(self.delay)
+        return super().next_target()
+
+
+class BrokenAIPlayer(engine.AIPlayer):
+
+    def next_target(self):
+        raise RuntimeError('no target')
+
+
+class MoveSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = scheduler.MoveScheduler(max_workers=2, deadline=0.05)
+
+    def tearDown(self):
+        self.scheduler.shutdown()
+
+    def test_fast_player_target(self):
+        player = engine.RandomAIPlayer('Computer')
+        expected = player.targets[0]
+
+        self.assertEqual(self.scheduler.next_target(player, deadline=5), expected)
+
+    def test_deadline_uses_best_target_so_far(self):
+        player = SlowAIPlayer('Computer', ['B2', 'C3'])
+
+        self.assertEqual(self.scheduler.next_target(player), 'C3')
+        self.assertTrue(player.stopped.wait(5))
+
+    def test_deadline_without_target_uses_fallback(self):
+        player = SlowAIPlayer('Computer', [])
+
+        self.assertEqual(self.scheduler.next_target(player), 'A1')
+
+    def test_default_fallback_skips_attacked(self):
+        player = engine.AIPlayer('Computer')
+        for coord in engine.COORDS[1:]:
+            player.record_outcome(coord, engine.Outcome.miss())
+
+        self.assertEqual(player.fallback_target(), 'A1')
+
+    def test_accepted_search_changes_player(self):
+        player = engine.HuntTargetAIPlayer('Computer')
+
+        target = self.scheduler.next_target(player, deadline=5)
+
+        self.assertIn(player.masks.index[target], player._attacked_cells)
+
+    def test_abandoned_search_leaves_player_unchanged(self):
+        player = SlowHuntTargetAIPlayer('Computer', delay=0.5)
+        started = time.monotonic()
+
+        move = self.scheduler.request_move(player)
+        move.result()
+
+        self.assertLess(time.monotonic() - started, 0.4)
+        move.future.result(5)
+        self.assertEqual(player._attacked_cells, set())
+
+    def test_queued_searches_do_not_hold_workers(self):
+        player = SlowAIPlayer('Computer', [])
+        for _ in range(2):
+            self.scheduler.request_move(player, deadline=5, session='game')
+        started = time.monotonic()
+
+        self.scheduler.next_target(engine.RandomAIPlayer('Computer'), deadline=5)
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.scheduler.cancel_session('game')
+        self.assertTrue(player.stopped.wait(5))
+
+    def test_search_errors_are_raised(self):
+        with self.assertRaises(RuntimeError):
+            self.scheduler.next_target(BrokenAIPlayer('Computer'), deadline=5)
+
+    def test_cancel_session(self):
+        player = SlowAIPlayer('Computer', ['B2'])
+        move = self.scheduler.request_move(player, deadline=5, session='game')
+
+        self.scheduler.cancel_session('game')
+
+        with self.assertRaises(scheduler.CancelledError):
+            move.result()
+        self.assertTrue(player.stopped.wait(5))
+
+    def test_next_target_async(self):
+        player = SlowAIPlayer('Computer', ['D4'])
+
+        target = asyncio.run(self.scheduler.next_target_async(player))
+
+        self.assertEqual(target, 'D4')
+
+
+class SimulationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.queue_dir = tempfile.mkdtemp()
+        self.job = simulate.Job(self.queue_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.queue_dir)
+
+    def test_create_splits_seeds_into_shards(self):
+        self.assertEqual(self.job.create('hunt', 'random', 0, 25, 10), 3)
+        self.assertEqual(len(self.job.pending()), 3)
+
+    def test_claim_is_exclusive(self):
+        self.job.create('hunt', 'random', 0, 10, 10)
+
+        self.assertEqual(self.job.claim(), 'shard-000000.json')
+        self.assertIsNone(self.job.claim())
+
+    def test_stale_claim_is_requeued(self):
+        self.job.create('hunt', 'random', 0, 10, 10)
+        name = self.job.claim()
+        os.utime(os.path.join(self.job.claimed_dir, name), (0, 0))
+
+        self.assertEqual(self.job.requeue_stale(60), [name])
+        self.assertEqual(self.job.pending(), [name])
+
+    def test_games_are_reproducible(self):
+        first = {role: stats.GameStats() for role in simulate.ROLES}
+        second = {role: stats.GameStats() for role in simulate.ROLES}
+
+        simulate.play_game('hunt', 'random', 7, first)
+        simulate.play_game('hunt', 'random', 7, second)
+
+        self.assertEqual(list(first['first'].shots_to_win),
+                         list(second['first'].shots_to_win))
+
+    def test_game_restores_global_random_state(self):
+        state = simulate.random.getstate()
+
+        simulate.play_game('hunt', 'random', 7, {role: stats.GameStats() for role in simulate.ROLES})
+
+        self.assertEqual(simulate.random.getstate(), state)
+
+    def test_worker_waits_for_requeued_shards(self):
+        self.job.create('random', 'hunt', 0, 8, 4)
+        crashed = self.job.claim()
+        worker = threading.Thread(target=simulate.run_worker,
+                                  args=(self.queue_dir, 0.01))
+        worker.start()
+        time.sleep(0.2)
+
+        self.assertTrue(worker.is_alive())
+        os.utime(os.path.join(self.job.claimed_dir, crashed), (0, 0))
+        self.job.requeue_stale(60)
+        worker.join(10)
+
+        self.assertFalse(worker.is_alive())
+        self.assertTrue(self.job.is_complete())
+
+    def test_local_run_merges_all_shards(self):
+        self.job.create('random', 'hunt', 0, 12, 4)
+        crashed = self.job.claim()
+        os.utime(os.path.join(self.job.claimed_dir, crashed), (0, 0))
+
+        report = simulate.run_local(self.queue_dir, 'random', 'hunt', 0, 12,
+                                    workers=2, stale_timeout=60, poll=0.05)
+
+        self.assertEqual(report['games'], 12)
+        self.assertEqual(report['stats']['first'].games, 12)
+        self.assertEqual(sum(report['wins'].values()), 12)
+        self.assertEqual(self.job.claimed(), [])
+
+
+class SessionManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store_dir = tempfile.mkdtemp()
+        self.manager = sessions.SessionManager(self.store_dir, max_sessions=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.store_dir)
+
+    def new_game(self):
+        defender = engine.Player('Player Two')
+        defender.battle_grid.place_ship(
+            engine.Ship.destroyer(), 'C7', engine.Orientation.PORTRAIT)
+        return engine.Game(engine.Player('Player One'), defender)
+
+    def test_least_recently_used_is_evicted(self):
+        for session_id in ['a', 'b', 'c']:
+            self.manager.add(session_id, self.new_game())
+
+        self.assertFalse(self.manager.is_resident('a'))
+        self.assertTrue(os.path.exists(os.path.join(self.store_dir, 'a.game')))
+        self.assertEqual(self.manager.metrics()['evictions'], 1)
+
+    def test_duplicate_session_raises_exception(self):
+        self.manager.add('a', self.new_game())
+        before = self.manager.metrics()
+
+        with self.assertRaises(sessions.SessionExists) as cm:
+            self.manager.add('a', self.new_game())
+
+        self.assertEqual(cm.exception.session_id, 'a')
+        self.assertEqual(self.manager.metrics(), before)
+
+    def test_evicted_session_reloads_on_turn(self):
+        self.manager.add('a', self.new_game())
+        self.manager.take_turn('a', 'C7')
+        self.manager.evict('a')
+
+        self.assertEqual(engine.Outcome.win(engine.Ship.destroyer()),
+                         self.manager.take_turn('a', 'D7'))
+        self.assertTrue(self.manager.is_resident('a'))
+
+        metrics = self.manager.metrics()
+        self.assertEqual((metrics['hits'], metrics['misses']), (1, 1))
+
+    def test_already_attacked_survives_eviction(self):
+        self.manager.add('a', self.new_game())
+        self.manager.take_turn('a', 'A1')
+        self.manager.evict('a')
+
+        with self.assertRaises(engine.AlreadyAttacked):
+            self.manager.take_turn('a', 'A1')
+
+    def test_subscriptions_survive_eviction(self):
+        game = self.new_game()
+        subscription = game.subscribe()
+        self.manager.add('a', game)
+        self.manager.evict('a')
+
+        self.manager.take_turn('a', 'A1')
+
+        self.assertEqual(len(subscription.drain()), 2)
+
+    def test_byte_budget(self):
+        manager = sessions.SessionManager(self.store_dir, max_bytes=1)
+        manager.add('a', self.new_game())
+        manager.add('b', self.new_game())
+
+        self.assertLessEqual(manager.metrics()['resident'], 1)
+
+    def test_unknown_session_raises_exception(self):
+        with self.assertRaises(sessions.UnknownSession):
+            self.manager.take_turn('missing', 'A1')
+
+    def test_unknown_player_raises_exception(self):
+        self.manager.add('a', self.new_game())
+
+        with self.assertRaises(ValueError):
+            self.manager.play_turn('a', 'Player Three', 'C7')
+        self.assertEqual(self.manager.take_turn('a', 'C7'),
+                         engine.Outcome.hit(engine.Ship.destroyer()))
+
+    def test_session_removed_while_waiting_raises_exception(self):
+        self.manager.add('a', self.new_game())
+        self.manager.evict('a')
+        errors = []
+
+        def take_turn():
+            try:
+                self.manager.take_turn('a', 'C7')
+            except Exception as error:
+                errors.append(error)
+
+        lock = self.manager._locks['a']
+        with lock:
+            turn = threading.Thread(target=take_turn)
+            turn.start()
+            time.sleep(0.1)
+            # let remove() run while the turn still waits on the old lock
+            self.manager._locks['a'] = threading.Lock()
+            self.manager.remove('a')
+        turn.join(5)
+
+        self.assertEqual([type(error) for error in errors], [sessions.UnknownSession])
+
+
+class PlacementPriorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.prior = prior.PlacementPrior(smoothing=1.0)
+        self.grid = engine.BattleGrid()
+        for ship, origin in zip(engine.fleet, ['A1', 'B1', 'C1', 'D1', 'E1']):
+            self.grid.place_ship(copy.copy(ship), origin, engine.Orientation.LANDSCAPE)
+
+    def test_observe_counts_cells_and_placements(self):
+        self.prior.observe(self.grid)
+
+        self.assertEqual(self.prior.games, 1)
+        self.assertEqual(self.prior.cell_counts.sum(), 17)
+        placement = self.grid.masks.placement('A1', engine.Orientation.LANDSCAPE, 5)
+        self.assertEqual(self.prior.placement_counts('Carrier')[placement.number], 1)
+
+    def test_prior_learns_from_layouts(self):
+        uniform = self.prior.probability('A1')
+
+        for _ in range(9):
+            self.prior.observe(self.grid)
+
+        self.assertGreater(self.prior.probability('A1'), uniform)
+        self.assertLess(self.prior.probability('H8'), uniform)
+        self.assertAlmostEqual(self.prior.probability('A1'), (9 + uniform) / 10)
+
+    def test_snapshot_is_memory_mapped_on_load(self):
+        path = os.path.join(tempfile.mkdtemp(), 'prior.npy')
+        self.prior.observe(self.grid)
+        self.prior.snapshot(path)
+
+        loaded = prior.PlacementPrior.load(path, smoothing=1.0)
+        loaded.observe(self.grid)
+
+        self.assertIsInstance(loaded.counts, numpy.memmap)
+        self.assertEqual(loaded.games, 2)
+        self.assertEqual(prior.PlacementPrior.load(path).games, 1)
+        shutil.rmtree(os.path.dirname(path))
+
+    def test_incompatible_snapshot_raises_exception(self):
+        path = os.path.join(tempfile.mkdtemp(), 'prior.npy')
+        self.prior.snapshot(path)
+
+        with self.assertRaises(prior.IncompatibleSnapshot):
+            prior.PlacementPrior.load(path, ships=[engine.Ship.destroyer()])
+        shutil.rmtree(os.path.dirname(path))
+
+    def test_hunting_prefers_likely_cells(self):
+        pool = engine._CellPool(64)
+        pool.add(0)
+        pool.add(63)
+        scores = numpy.zeros(64)
+        scores[63] = 1.0
+
+        self.assertEqual(pool.pop_best(scores, 50), 63)
+        self.assertEqual(len(pool), 1)
+
+    def test_automatic_snapshots_need_a_path(self):
+        with self.assertRaises(ValueError):
+            prior.PlacementPrior(snapshot_every=1)
+
+        with self.assertRaises(ValueError):
+            self.prior.snapshot()
+
+    def test_player_follows_learning_prior(self):
+        player = engine.HuntTargetAIPlayer('Computer', prior=self.prior)
+        player.next_target()
+
+        self.prior.observe(self.grid)
+
+        self.assertIs(player._prior_scores(), self.prior.cell_prior())
+        self.assertIn(player.next_target(), engine.COORDS)
+
+
+def _shared_turn(board_store, slot, coord, results):
+    results.put(_pooled_turn(board_store, slot, coord))
+
+
+def _pooled_turn(board_store, slot, coord):
+    try:
+        return str(board_store.take_turn(slot, coord))
+    finally:
+        board_store.close()
+
+
+def _attached_turn(name, slot, coord):
+    return _pooled_turn(store.SharedBoardStore(2, name=name), slot, coord)
+
+
+class SharedBoardStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = store.SharedBoardStore(2)
+
+        self.p1 = engine.Player('Player One')
+        self.p2 = engine.Player('Player Two')
+        self.p2.battle_grid.place_ship(
+            engine.Ship.submarine(), 'A1', engine.Orientation.LANDSCAPE)
+        self.p2.battle_grid.place_ship(
+            engine.Ship.destroyer(), 'C7', engine.Orientation.PORTRAIT)
+        self.game = engine.Game(self.p1, self.p2)
+
+        self.slot = self.store.allocate()
+        self.store.save(self.slot, self.game)
+        self.shared_game = store.SharedGame(self.store, self.slot)
+
+    def tearDown(self):
+        self.store.close()
+        self.store.unlink()
+
+    def test_allocate_and_free(self):
+        other = self.store.allocate()
+        self.assertNotEqual(other, self.slot)
+
+        with self.assertRaises(store.NoFreeSlot):
+            self.store.allocate()
+
+        self.store.free(other)
+        self.assertFalse(self.store.in_use(other))
+        self.assertEqual(self.store.allocate(), other)
+
+    def test_take_turn_matches_game(self):
+        for coord in ['B3', 'A1', 'A2', 'A3', 'D7', 'C7']:
+            self.assertEqual(
+                self.game.take_turn(coord), self.shared_game.take_turn(coord))
+
+    def test_already_attacked_raises_exception(self):
+        self.shared_game.take_turn('A1')
+
+        with self.assertRaises(engine.AlreadyAttacked) as cm:
+            self.shared_game.take_turn('A1')
+
+        self.assertEqual(cm.exception.coord, 'A1')
+
+    def test_next_player(self):
+        self.assertEqual(self.shared_game.next_player(), 1)
+        self.assertEqual(
+            engine.Outcome.miss(), self.shared_game.take_turn('A1'))
+
+    def test_load_restores_game(self):
+        self.shared_game.take_turn('A1')
+        self.shared_game.take_turn('B1')
+        self.shared_game.next_player()
+
+        restored = engine.Game(engine.Player('Player One'),
+                               engine.Player('Player Two'))
+        self.store.load(self.slot, restored)
+
+        self.assertEqual(restored.current_player, self.p2)
+        self.assertTrue(restored.computer.battle_grid.grid['A1'].is_hit())
+        self.assertTrue(restored.computer.battle_grid.grid['B1'].is_miss())
+        restored.next_player()
+        self.assertEqual(engine.Outcome.hit(engine.Ship.submarine()),
+                         restored.take_turn('A2'))
+
+    def test_turn_resolved_in_other_process(self):
+        results = multiprocessing.Queue()
+        worker = multiprocessing.Process(
+            target=_shared_turn, args=(self.store, self.slot, 'A1', results))
+        worker.start()
+        worker.join()
+
+        self.assertEqual(results.get(), 'Hit Submarine')
+        with self.assertRaises(engine.AlreadyAttacked):
+            self.shared_game.take_turn('A1')
+
+    def test_reveal_rules_match_game(self):
+        rules = engine.Ruleset(reveal_adjacent_on_sunk=True)
+        reveal_store = store.SharedBoardStore(1, ruleset=rules)
+        self.addCleanup(reveal_store.unlink)
+        self.addCleanup(reveal_store.close)
+
+        defender = engine.Player('Player Two', rules)
+        defender.battle_grid.place_ship(
+            engine.Ship.destroyer(), 'A1', engine.Orientation.LANDSCAPE)
+        defender.battle_grid.place_ship(
+            engine.Ship.submarine(), 'B3', engine.Orientation.LANDSCAPE)
+        game = engine.Game(engine.Player('Player One', rules), defender)
+        slot = reveal_store.allocate()
+        reveal_store.save(slot, game)
+
+        for coord in ['A1', 'A2']:
+            expected = game.take_turn(coord)
+            actual = reveal_store.take_turn(slot, coord)
+            self.assertEqual(expected, actual)
+            self.assertEqual(expected.revealed, actual.revealed)
+        self.assertEqual(actual.revealed, ['A3', 'B1', 'B2'])
+
+        restored = engine.Game(engine.Player('Player One'), engine.Player('Player Two'))
+        reveal_store.load(slot, restored)
+        grid = restored.computer.battle_grid
+        self.assertTrue(grid.ruleset.reveal_adjacent_on_sunk)
+        self.assertTrue(grid.grid['B2'].is_miss())
+        self.assertEqual(grid.masks.coords_of(grid.attacked), ['A1', 'A2', 'A3', 'B1', 'B2'])
+        self.assertEqual([placement.origin_coord for _, placement in grid.placements],
+                         ['B3', 'A1'])
+
+    def test_save_rejects_other_rules(self):
+        player = engine.Player('Player One', engine.Ruleset(no_touch=True))
+        game = engine.Game(player, engine.Player('Player Two'))
+
+        with self.assertRaises(store.IncompatibleRuleset):
+            self.store.save(self.slot, game)
+
+    def test_block_survives_exit_of_independent_attached_process(self):
+        script = ('import store; '
+                  'attached = store.SharedBoardStore(2, name={0!r}); '
+                  'print(attached.take_turn({1}, "A1")); '
+                  'attached.close()').format(self.store.name, self.slot)
+        output = subprocess.run(
+            [sys.executable, '-c', script], check=True, capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+
+        self.assertEqual(output.strip(), 'Hit Submarine')
+        reattached = store.SharedBoardStore(2, name=self.store.name)
+        reattached.close()
+        self.assertEqual(engine.Outcome.hit(engine.Ship.submarine()),
+                         self.shared_game.take_turn('A2'))
+
+    def test_turn_resolved_in_pool_worker(self):
+        with multiprocessing.get_context('spawn').Pool(1) as pool:
+            self.assertEqual(
+                pool.apply(_pooled_turn, (self.store, self.slot, 'A1')),
+                'Hit Submarine')
+
+        with self.assertRaises(engine.AlreadyAttacked):
+            self.shared_game.take_turn('A1')
+
+    def test_turn_resolved_by_store_attached_by_name(self):
+        with multiprocessing.Pool(2) as pool:
+            outcomes = pool.starmap(
+                _attached_turn,
+                [(self.store.name, self.slot, coord) for coord in ('A1', 'A2', 'A3')])
+        self.assertEqual(sorted(outcomes), ['Hit Submarine', 'Hit Submarine', 'Sunk Submarine'])
+
+        attached = store.SharedBoardStore(2, name=self.store.name)
+        self.assertEqual(engine.Outcome.miss(), attached.take_turn(self.slot, 'H8'))
+        attached.close()
+        with self.assertRaises(engine.AlreadyAttacked):
+            self.shared_game.take_turn('H8')
+
 
 if __name__ == '__main__':
     unittest.main()